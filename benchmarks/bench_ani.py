@@ -0,0 +1,48 @@
+"""
+Benchmark of the native .ANI parser against the MDAnalysis XYZ reader.
+
+    python benchmarks/bench_ani.py --frames 1000 --atoms 1000
+"""
+import argparse, os, sys, tempfile, time
+import numpy as np
+import MDAnalysis as MD
+
+#import ccmp_tools from the checkout this script is in, so that it runs without PYTHONPATH or installing
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ccmp_tools import ani
+from synthetic import write_ani
+
+
+def mdanalysis(anip):
+    u = MD.Universe(anip, topology_format='xyz', format='xyz')
+    return np.array([ts.positions.copy() for ts in u.trajectory])
+
+
+def native(anip):
+    return ani.readani(anip)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--atoms', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        anip = os.path.join(tmp, 'bench.ANI')
+        write_ani(anip, args.frames, args.atoms)
+        print('{} frames x {} atoms, {:.1f} MB'.format(args.frames, args.atoms, os.path.getsize(anip) / 1e6))
+        reference = None
+        for reader in (mdanalysis, native):
+            times = []
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                positions = reader(anip)
+                times.append(time.perf_counter() - start)
+            reference = positions if reference is None else reference
+            assert np.allclose(positions, reference, atol=1e-5)
+            print('{:<12}{:10.3f} s (best of {})'.format(reader.__name__, min(times), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
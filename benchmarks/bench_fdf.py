@@ -0,0 +1,59 @@
+"""
+Benchmark of per-run FDF metadata extraction with the built-in reader against sisl.
+
+    python benchmarks/bench_fdf.py --runs 500 --atoms 256
+"""
+import argparse, os, subprocess, sys, tempfile, time
+import numpy as np
+
+#import ccmp_tools from the checkout this script is in, so that it runs without PYTHONPATH or installing
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ccmp_tools import fdf
+from ccmp_tools.md import SiestaSimulation
+from synthetic import write_fdf
+
+FIELDS = ('simlabel', 'latticeconstant', 'latticevectors', 'dt', 'nsteps', 'simtype', 'mdtype', 'natoms',
+          'nspecies', 'temperature', 'chemspeclab')
+
+
+def extract(paths, reader):
+    fdf.CACHE.clear()
+    records = []
+    for path in paths:
+        sim = SiestaSimulation(path, fdfreader=reader)
+        records.append(tuple(np.asarray(getattr(sim, f)).tolist() for f in FIELDS))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=500)
+    parser.add_argument('--atoms', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    #sisl is imported on first use only, so its import is measured separately in a fresh interpreter
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import sisl'], check=True)
+    print('{:<12}{:10.3f} s'.format('import sisl', time.perf_counter() - start))
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.runs):
+            paths.append(os.path.join(tmp, 'run{:05d}'.format(i)))
+            os.mkdir(paths[-1])
+            write_fdf(os.path.join(paths[-1], 'bench.fdf'), args.atoms, seed=i)
+        size = os.path.getsize(os.path.join(paths[0], 'bench.fdf'))
+        print('{} runs, {:.1f} kB per FDF'.format(args.runs, size / 1e3))
+        reference = None
+        for reader in ('sisl', 'builtin'):
+            times = []
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                records = extract(paths, reader)
+                times.append(time.perf_counter() - start)
+            reference = records if reference is None else reference
+            assert records == reference
+            print('{:<12}{:10.3f} ms per run (best of {})'.format(reader, 1e3 * min(times) / args.runs, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
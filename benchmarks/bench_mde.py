@@ -0,0 +1,45 @@
+"""
+Benchmark of the .MDE loader against np.loadtxt.
+
+    python benchmarks/bench_mde.py --rows 10000000
+"""
+import argparse, os, sys, tempfile, time
+import numpy as np
+
+#import ccmp_tools from the checkout this script is in, so that it runs without PYTHONPATH or installing
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ccmp_tools import mde
+from synthetic import write_mde
+
+
+def loadtxt(mdep):
+    return np.loadtxt(mdep, comments='#')
+
+
+def readmde(mdep):
+    return mde.readmde(mdep)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10**7)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        mdep = os.path.join(tmp, 'bench.MDE')
+        write_mde(mdep, args.rows)
+        print('{} rows, {:.1f} MB'.format(args.rows, os.path.getsize(mdep) / 1e6))
+        reference = None
+        for reader in (loadtxt, readmde):
+            times = []
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                rows = reader(mdep)
+                times.append(time.perf_counter() - start)
+            reference = rows if reference is None else reference
+            assert np.array_equal(rows, reference)
+            print('{:<12}{:10.3f} s (best of {})'.format(reader.__name__, min(times), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Benchmark suite of the loading paths of SiestaSimulation on synthetic runs, compared against stored baselines.
+
+    python benchmarks/suite.py --preset small            # compare with benchmarks/baselines.json
+    python benchmarks/suite.py --preset medium --save    # record new baselines for this machine
+    python benchmarks/suite.py --frames 100000 --atoms 10 --cases iMDE iMD_native
+
+Absolute times only compare on the host they were recorded on: on any other (see host()), they are
+printed next to the baselines but do not fail the run.
+"""
+import argparse, json, os, platform, sys, tempfile, time
+
+#import ccmp_tools from the checkout this script is in, so that it runs without PYTHONPATH or installing
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ccmp_tools import fdf
+from ccmp_tools.campaign import FDFFIELDS
+from ccmp_tools.md import SiestaSimulation, _frameblocks
+from synthetic import write_run
+
+#frames and atoms of the .ANI file, rows of the .MDE file and unrelated files in the run directory
+PRESETS = {
+    'small': dict(frames=100, atoms=10, rows=1000, extra=100),
+    'medium': dict(frames=1000, atoms=1000, rows=100000, extra=1000),
+    'long': dict(frames=100000, atoms=10, rows=1000000, extra=1000),
+    'wide': dict(frames=100, atoms=10000, rows=1000, extra=1000),
+    'huge': dict(frames=1000000, atoms=10, rows=1000000, extra=10000),
+}
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+
+def filefind(run, tmp):
+    sim = SiestaSimulation(run)
+    sim._filefind(True, '.MDE', 'mdep')
+
+
+def fdf_metadata(run, tmp):
+    fdf.CACHE.clear()
+    sim = SiestaSimulation(run)
+    [getattr(sim, f) for f in FDFFIELDS]
+
+
+def fdf_metadata_sisl(run, tmp):
+    fdf.CACHE.clear()
+    sim = SiestaSimulation(run, fdfreader='sisl')
+    [getattr(sim, f) for f in FDFFIELDS]
+
+
+def iMDE(run, tmp):
+    SiestaSimulation(run).iMDE(True)
+
+
+def iMD_xyz(run, tmp):
+    sim = SiestaSimulation(run)
+    sim.iMD(True)
+    #the XYZ reader parses lazily, so the frames are read as well
+    for block in _frameblocks(sim.universe.trajectory):
+        pass
+
+
+def iMD_native(run, tmp):
+    SiestaSimulation(run).iMD(True, native=True)
+
+
+def iMD_parallel(run, tmp):
+    SiestaSimulation(run).iMD(True, nprocs=2)
+
+
+def iMD_cache(run, tmp):
+    #the first call writes the cache, the timed ones memory-map it
+    SiestaSimulation(run).iMD(True, cache=tmp)
+
+
+def iMD_index_frame(run, tmp):
+    sim = SiestaSimulation(run)
+    sim.iMD(True, index=tmp)
+    sim.frame(-1)
+
+
+def iterMD(run, tmp):
+    #batches parsed straight from the .ANI file and reduced without a Universe
+    for steps, times, block in SiestaSimulation(run).iterMD():
+        block.min(axis=(0, 1))
+
+
+CASES = {f.__name__: f for f in (filefind, fdf_metadata, fdf_metadata_sisl, iMDE, iMD_xyz, iMD_native,
+                                   iMD_parallel, iMD_cache, iMD_index_frame, iterMD)}
+
+
+def host():
+    '''Machine, processor model, number of CPUs and Python version, which the times depend on.'''
+    processor = platform.processor()
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as f:
+            models = [line.split(':', 1)[1].strip() for line in f if line.startswith('model name')]
+        processor = models[0] if models else processor
+    return {'machine': platform.machine(), 'processor': processor, 'cpus': os.cpu_count(),
+            'python': platform.python_version()}
+
+
+def measure(func, repeat, run, tmp, mintime=0.05):
+    '''
+    Best time per call out of repeat timings, each of as many calls as take at least mintime
+    (as timeit.autorange).
+    '''
+    func(run, tmp)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for j in range(number):
+            func(run, tmp)
+        elapsed = time.perf_counter() - start
+        if elapsed >= mintime:
+            break
+        number *= 2
+    best = elapsed / number
+    for i in range(repeat - 1):
+        start = time.perf_counter()
+        for j in range(number):
+            func(run, tmp)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--frames', type=int)
+    parser.add_argument('--atoms', type=int)
+    parser.add_argument('--rows', type=int)
+    parser.add_argument('--extra', type=int)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', action='store_true', help='store the times as baselines of the preset')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='flag cases slower than tolerance times their baseline')
+    parser.add_argument('--baselines', default=BASELINES)
+    parser.add_argument('--anyhost', action='store_true',
+                        help='fail on slower cases even if the baselines were recorded on another host')
+    args = parser.parse_args()
+    size = dict(PRESETS[args.preset])
+    size.update((k, getattr(args, k)) for k in size if getattr(args, k) is not None)
+    #baselines only make sense for the sizes they were recorded at
+    key = args.preset if size == PRESETS[args.preset] else '{frames}x{atoms}-{rows}-{extra}'.format(**size)
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    reference = baselines.get(key, {}).get('times', {})
+    recorded = {k: baselines.get(key, {}).get(k) for k in host()}
+    gate = recorded == host() or args.anyhost
+    if reference and not gate:
+        print('baselines of {} were recorded on {}, this is {}: not failing on slower cases'.format(
+            key, recorded, host()))
+    with tempfile.TemporaryDirectory() as tmp:
+        run = write_run(os.path.join(tmp, 'run'), size['frames'], size['atoms'], size['rows'], size['extra'])
+        os.mkdir(os.path.join(tmp, 'cache'))
+        print('{}: {frames} frames x {atoms} atoms, {rows} MDE rows, {extra} other files'.format(key, **size))
+        times, slower = {}, []
+        for name in args.cases:
+            times[name] = measure(CASES[name], args.repeat, run, os.path.join(tmp, 'cache'))
+            line = '{:<20}{:12.6f} s'.format(name, times[name])
+            if name in reference:
+                ratio = times[name] / reference[name]
+                line += '  {:6.2f}x baseline'.format(ratio)
+                if ratio > args.tolerance:
+                    line += '  SLOWER'
+                    if gate:
+                        slower.append(name)
+            print(line)
+    if args.save:
+        entry = baselines.setdefault(key, {'times': {}})
+        #times of another host are replaced, not mixed with the new ones
+        if recorded != host():
+            entry['times'] = {}
+        entry['times'].update(times)
+        entry.update(size=size, **host())
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=1, sort_keys=True)
+            f.write('\n')
+        print('baselines saved to {}'.format(args.baselines))
+    if slower:
+        print('slower than {}x baseline: {}'.format(args.tolerance, ', '.join(slower)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
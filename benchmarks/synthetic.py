@@ -0,0 +1,76 @@
+"""
+Generators of synthetic SIESTA output for the benchmarks: FDF, .ANI and .MDE files of configurable size.
+
+    python benchmarks/synthetic.py run/ --frames 1000 --atoms 1000 --rows 100000
+"""
+import argparse, os
+import numpy as np
+
+SYMBOLS = ('O', 'H', 'H')
+
+
+def write_fdf(path, natoms, nsteps=10000, label='bench', coordinates=True, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, 'w') as f:
+        f.write('SystemName {0}\nSystemLabel {0}\nNumberOfAtoms {1}\nNumberOfSpecies 2\n'.format(label, natoms))
+        f.write('%block ChemicalSpeciesLabel\n 1 8 O\n 2 1 H\n%endblock ChemicalSpeciesLabel\n')
+        f.write('LatticeConstant 1.0 Ang\n%block LatticeVectors\n 20.0 0.0 0.0\n 0.0 20.0 0.0\n 0.0 0.0 20.0\n'
+                '%endblock LatticeVectors\n')
+        f.write('PAO.BasisSize DZP\nMeshCutoff 300 Ry\nXC.functional GGA\nXC.authors PBE\n')
+        f.write('MD.TypeOfRun Nose\nMD.InitialTimeStep 1\nMD.FinalTimeStep {}\nMD.LengthTimeStep 0.5 fs\n'
+                'MD.TargetTemperature 300 K\n'.format(nsteps))
+        if coordinates:
+            f.write('AtomicCoordinatesFormat Ang\n%block AtomicCoordinatesAndAtomicSpecies\n')
+            for xyz in rng.uniform(0., 20., (natoms, 3)):
+                f.write('{:12.6f}{:12.6f}{:12.6f} {}\n'.format(*xyz, rng.integers(1, 3)))
+            f.write('%endblock AtomicCoordinatesAndAtomicSpecies\n')
+
+
+def write_ani(path, nframes, natoms, seed=0, distinct=64):
+    '''Only `distinct` different frames are formatted, then repeated: 10^6 frames are written at disk speed.'''
+    rng = np.random.default_rng(seed)
+    symbols = np.resize(SYMBOLS, natoms)
+    frames = []
+    for frame in rng.uniform(-5., 20., size=(min(nframes, distinct), natoms, 3)):
+        frames.append(('{}\n\n'.format(natoms) + ''.join('{:<3}{:16.8f}{:16.8f}{:16.8f}\n'.format(s, *xyz)
+                                                          for s, xyz in zip(symbols, frame))).encode())
+    with open(path, 'wb') as f:
+        for i in range(nframes):
+            f.write(frames[i % len(frames)])
+
+
+def write_mde(path, nrows, seed=0, chunk=1000000):
+    rng = np.random.default_rng(seed)
+    with open(path, 'w') as f:
+        f.write('# Step     T (K)     E_KS (eV)     E_tot (eV)    Vol (A^3)    P (kBar)\n')
+        for first in range(0, nrows, chunk):
+            n = min(chunk, nrows - first)
+            rows = np.column_stack([np.arange(first + 1, first + n + 1), rng.uniform(250., 350., n),
+                                    rng.uniform(-500., -400., (n, 2)), np.full(n, 1000.), rng.normal(0., 5., n)])
+            np.savetxt(f, rows, fmt=['%7d', '%12.3f', '%16.6f', '%16.6f', '%12.3f', '%12.3f'], delimiter='')
+
+
+def write_run(path, nframes, natoms, nrows=None, extra=0, seed=0):
+    '''Run directory with bench.fdf, bench.ANI, bench.MDE (nrows, default nframes rows) and `extra` unrelated files.'''
+    os.makedirs(path, exist_ok=True)
+    write_fdf(os.path.join(path, 'bench.fdf'), natoms, nsteps=nframes, seed=seed)
+    write_ani(os.path.join(path, 'bench.ANI'), nframes, natoms, seed=seed)
+    write_mde(os.path.join(path, 'bench.MDE'), nrows if nrows else nframes, seed=seed)
+    for i in range(extra):
+        open(os.path.join(path, 'out{:05d}.dat'.format(i)), 'w').close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('path')
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--atoms', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=None)
+    parser.add_argument('--extra', type=int, default=0)
+    args = parser.parse_args()
+    write_run(args.path, args.frames, args.atoms, args.rows, args.extra)
+
+
+if __name__ == '__main__':
+    main()
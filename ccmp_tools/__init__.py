@@ -5,6 +5,10 @@ sbu-ccmp-tools
 
 # Add imports here
 from .ccmp_tools import *
+#sisl and MDAnalysis are imported by md only when an FDF or a trajectory is read
+from .md import Simulation, SiestaSimulation
+from .campaign import SimulationSet
+from .catalog import Catalog
 
 # Handle versioneer
 from ._version import get_versions
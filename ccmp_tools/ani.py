@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Utilities for SIESTA .ANI trajectories (XYZ frames with a fixed number of atoms).
+"""
+import os, re, tempfile
+import numpy as np
+
+def _filekey(path):
+    '''
+    Parameters
+    ----------
+    path : str
+        File to fingerprint.
+
+    Returns
+    -------
+    key : str
+        "<size>-<mtime in ns>" of the file, used to tell whether anything derived from it is stale.
+    '''
+    st = os.stat(path)
+    return '{}-{}'.format(st.st_size, st.st_mtime_ns)
+
+def _sidecar(path, suffix, cachedir=None):
+    '''
+    Parameters
+    ----------
+    path : str
+        Source file the sidecar is derived from.
+    suffix : str
+        Extension of the sidecar, e.g. '.npy'.
+    cachedir : str, optional
+        Directory to keep the sidecar in. The default is None, next to path.
+
+    Returns
+    -------
+    sidecar : str
+        Path "<cachedir>/<basename>.<size>-<mtime>.<suffix>", so that a modified source never matches an old sidecar.
+    '''
+    cachedir = cachedir if cachedir else os.path.dirname(os.path.abspath(path))
+    return os.path.join(cachedir, '{}.{}{}'.format(os.path.basename(path), _filekey(path), suffix))
+
+def _atomicwrite(dest, write):
+    '''
+    Parameters
+    ----------
+    dest : str
+        Final location of the file.
+    write : callable
+        Called with the path of a temporary file in the same directory as dest, which it has to fill.
+
+    Returns
+    -------
+    None. The temporary file is renamed onto dest with os.replace, so readers (including other processes
+    sharing the cache) only ever see either no file or a complete one.
+    '''
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(dest) + '.', suffix='.tmp',
+                               dir=os.path.dirname(os.path.abspath(dest)))
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def issidecar(name):
+    '''True if name looks like a cache or index file written next to a trajectory by this module.'''
+    return re.search(r'\.\d+-\d+(\.idx)?\.npy$', name) is not None
+
+def _prune(path, suffix, keep, cachedir=None):
+    '''Remove sidecars of path with the given suffix other than keep, i.e. the ones left behind by older versions.'''
+    cachedir = cachedir if cachedir else os.path.dirname(os.path.abspath(path))
+    prefix = os.path.basename(path) + '.'
+    for entry in os.scandir(cachedir):
+        if not (entry.name.startswith(prefix) and entry.name.endswith(suffix)) or entry.path == keep:
+            continue
+        #only "<basename>.<size>-<mtime><suffix>", so that e.g. '.npy' does not match '.idx.npy' sidecars
+        if re.fullmatch(r'\d+-\d+', entry.name[len(prefix):-len(suffix)]):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+def cachepath(anip, cachedir=None):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    cachedir : str, optional
+        Directory holding the cache. The default is None, next to the .ANI file.
+
+    Returns
+    -------
+    path : str
+        Location of the float32 position cache for the current size and modification time of anip.
+    '''
+    return _sidecar(anip, '.npy', cachedir)
+
+def writecache(anip, blocks, shape, cachedir=None):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file the positions were read from.
+    blocks : iterable of np.ndarray
+        Consecutive (k, natoms, 3) blocks of positions covering the full trajectory.
+    shape : tuple
+        (nframes, natoms, 3), the shape of the full trajectory.
+    cachedir : str, optional
+        Directory holding the cache. The default is None, next to the .ANI file.
+
+    Returns
+    -------
+    path : str
+        Path of the written cache. The cache is written atomically and stale caches of anip are removed.
+    '''
+    path = cachepath(anip, cachedir)
+    _atomicwrite(path, _blockwriter(blocks, shape))
+    _prune(anip, '.npy', path, cachedir)
+    return path
+
+def _blockwriter(blocks, shape):
+    '''Function filling the float32 .npy file at its argument with the (k, natoms, 3) blocks, shape shape in all.'''
+    def write(tmp):
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=tuple(shape))
+        i = 0
+        for block in blocks:
+            out[i:i + len(block)] = block
+            i += len(block)
+        assert i == shape[0], "expected {} frames, got {}".format(shape[0], i)
+        out.flush()
+        del out
+    return write
+
+def _tempmap(anip, write, mode='c'):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file the positions are read from, which names the temporary file.
+    write : callable
+        Called with the path of a temporary .npy file in the system's temporary directory, which it has to fill.
+    mode : str, optional
+        Memory map mode, 'c' (copy-on-write) or 'r' (read-only). The default is 'c'.
+
+    Returns
+    -------
+    positions : np.memmap
+        Memory map of the file, which is removed as soon as it is mapped, so nothing is left behind.
+    '''
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(anip) + '.', suffix='.npy')
+    os.close(fd)
+    try:
+        write(tmp)
+        positions = np.load(tmp, mmap_mode=mode)
+    finally:
+        try:
+            #the mapping stays valid after removal on POSIX; elsewhere the file is left to the OS temp cleanup
+            os.remove(tmp)
+        except OSError:
+            pass
+    return positions
+
+def readcache(anip, cachedir=None, mode='c'):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    cachedir : str, optional
+        Directory holding the cache. The default is None, next to the .ANI file.
+    mode : str, optional
+        Memory map mode, 'c' (copy-on-write) or 'r' (read-only). The default is 'c'.
+
+    Returns
+    -------
+    positions : np.memmap or None
+        Memory map of shape (nframes, natoms, 3) if a cache matching the current size and
+        modification time of anip exists, otherwise None.
+    '''
+    path = cachepath(anip, cachedir)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode=mode)
+
+def readnatoms(anip):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+
+    Returns
+    -------
+    natoms : int
+        Atom count from the first line of the file, shared by every frame.
+    '''
+    with open(anip, 'rb') as f:
+        return int(f.readline())
+
+def estimate(anip, offsets=None):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    offsets : np.ndarray, optional
+        Frame offsets of anip, see frameindex. The default is None, estimated from the header.
+
+    Returns
+    -------
+    estimate : dict
+        'frames', 'atoms', 'filesize' and 'bytes', the size of the float32 positions of all frames in memory.
+        Without offsets only the first frame and the file size are read, and 'frames' is the file size divided
+        by the size of the first frame; 'exact' tells whether the frame count came from offsets.
+    '''
+    filesize = os.path.getsize(anip)
+    with open(anip, 'rb') as f:
+        natoms = int(f.readline())
+        if offsets is None:
+            for i in range(natoms + 1):
+                f.readline()
+            framebytes = f.tell()
+    nframes = len(offsets) - 1 if offsets is not None else filesize // max(framebytes, 1)
+    return {'frames': int(nframes), 'atoms': natoms, 'filesize': filesize, 'bytes': int(nframes)*natoms*3*4,
+            'exact': offsets is not None}
+
+def _isatomline(line):
+    '''Whether bytes line is a whole atom line of a frame: a symbol followed by three numbers.'''
+    fields = line.split()
+    if len(fields) < 4:
+        return False
+    try:
+        [float(x) for x in fields[1:4]]
+    except ValueError:
+        return False
+    return True
+
+def scanoffsets(anip, natoms=None, blocksize=1 << 24, partial=False):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    natoms : int, optional
+        Number of atoms per frame. The default is None, read from the first line.
+    blocksize : int, optional
+        Number of bytes scanned at once. The default is 16 MiB.
+    partial : bool, optional
+        If True, the file may still be written, so a last frame is only counted once its last line ends in a
+        newline. If False, a last frame without the final newline is counted if it has all natoms + 2 lines
+        and its last line is a whole atom line. The default is False.
+
+    Returns
+    -------
+    offsets : np.ndarray
+        int64 array of shape (nframes + 1,). offsets[i] is the byte offset of the atom count line of frame i,
+        and offsets[-1] the end of the last complete frame. A partially written last frame is not counted.
+    '''
+    natoms = natoms if natoms else readnatoms(anip)
+    linesperframe = natoms + 2
+    starts = [np.zeros(1, dtype=np.int64)]
+    seen = 0
+    base = 0
+    lastnewline = -1
+    with open(anip, 'rb') as f:
+        while True:
+            buf = f.read(blocksize)
+            if not buf:
+                break
+            newlines = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == ord('\n'))
+            #the newline numbered k*linesperframe - 1 ends a frame, the next byte starts the following one
+            first = (linesperframe - 1 - seen) % linesperframe
+            starts.append(newlines[first::linesperframe].astype(np.int64) + base + 1)
+            if len(newlines):
+                lastnewline = base + int(newlines[-1])
+            seen += len(newlines)
+            base += len(buf)
+        #a finished file may lack the newline after the last atom line of its last frame
+        if not partial and seen % linesperframe == linesperframe - 1 and base > lastnewline + 1:
+            f.seek(lastnewline + 1)
+            if _isatomline(f.read()):
+                starts.append(np.array([base], dtype=np.int64))
+    return np.concatenate(starts)
+
+def indexpath(anip, cachedir=None):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    cachedir : str, optional
+        Directory holding the index. The default is None, next to the .ANI file.
+
+    Returns
+    -------
+    path : str
+        Location of the persisted frame index for the current size and modification time of anip.
+    '''
+    return _sidecar(anip, '.idx.npy', cachedir)
+
+def frameindex(anip, cachedir=None, persist=True):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    cachedir : str, optional
+        Directory holding the index. The default is None, next to the .ANI file.
+    persist : bool, optional
+        If True, a freshly scanned index is written (atomically) to indexpath(anip, cachedir). The default is True.
+
+    Returns
+    -------
+    offsets : np.ndarray
+        Frame offsets as returned by scanoffsets, loaded from disk if an up-to-date index exists.
+    '''
+    path = indexpath(anip, cachedir)
+    if os.path.exists(path):
+        return np.load(path)
+    offsets = scanoffsets(anip)
+    if persist:
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                np.save(f, offsets)
+        _atomicwrite(path, write)
+        _prune(anip, '.idx.npy', path, cachedir)
+    return offsets
+
+def readframe(anip, offsets, frame):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    offsets : np.ndarray
+        Frame offsets of anip, see frameindex.
+    frame : int
+        Index of the frame to read; negative values count from the end.
+
+    Returns
+    -------
+    symbols : np.ndarray
+        Chemical symbols of the atoms, shape (natoms,).
+    positions : np.ndarray
+        float32 positions of the frame, shape (natoms, 3).
+    '''
+    frame = range(len(offsets) - 1)[frame]
+    with open(anip, 'rb') as f:
+        f.seek(offsets[frame])
+        lines = f.read(offsets[frame + 1] - offsets[frame]).rstrip(b'\n').split(b'\n')[2:]
+    fields = np.array([line.split()[:4] for line in lines])
+    return fields[:, 0].astype(str), fields[:, 1:].astype(np.float32)
+
+def parseblock(buf, natoms):
+    '''
+    Parameters
+    ----------
+    buf : bytes
+        Whole frames of an .ANI file, starting at a frame boundary.
+    natoms : int
+        Number of atoms per frame.
+
+    Returns
+    -------
+    positions : np.ndarray
+        float32 array of shape (nframes, natoms, 3) for the complete frames in buf.
+    '''
+    linesperframe = natoms + 2
+    lines = buf.split(b'\n')
+    nframes = len(lines) // linesperframe
+    #drop the trailing partial frame, then the atom count and comment line of every frame
+    del lines[nframes*linesperframe:]
+    del lines[::linesperframe]
+    del lines[::linesperframe - 1]
+    fields = b' '.join(lines).split()
+    #every fourth token is the chemical symbol
+    del fields[::4]
+    #parsing to float64 and casting is faster than parsing straight to float32
+    return np.array(fields, dtype=np.float64).astype(np.float32).reshape(nframes, natoms, 3)
+
+def follow(anip, offset=0, natoms=None):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to an .ANI file that may still be written.
+    offset : int, optional
+        Byte offset of a frame boundary to continue from, e.g. the offset returned by the previous call.
+        The default is 0.
+    natoms : int, optional
+        Number of atoms per frame. The default is None, read from the first line.
+
+    Returns
+    -------
+    positions : np.ndarray
+        float32 array of shape (k, natoms, 3) of the complete frames written after offset.
+    offset : int
+        Byte offset just after the last of them; a partially written frame is left for the next call. As the
+        file may still be written, a last frame counts as complete only once its last line ends in a newline
+        (see scanoffsets with partial=True).
+    '''
+    natoms = natoms if natoms else readnatoms(anip)
+    with open(anip, 'rb') as f:
+        f.seek(offset)
+        buf = f.read()
+    newlines = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == ord('\n'))
+    nframes = len(newlines) // (natoms + 2)
+    if not nframes:
+        return np.empty((0, natoms, 3), dtype=np.float32), offset
+    end = int(newlines[nframes*(natoms + 2) - 1]) + 1
+    return parseblock(buf[:end], natoms), offset + end
+
+def readsymbols(anip):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+
+    Returns
+    -------
+    symbols : np.ndarray
+        Chemical symbols of the atoms, shape (natoms,), parsed from the first frame only.
+    '''
+    with open(anip, 'rb') as f:
+        natoms = int(f.readline())
+        f.readline()
+        return np.array([f.readline().split()[0] for i in range(natoms)]).astype(str)
+
+def selectframes(nframes, start=None, stop=None, step=None):
+    '''
+    Parameters
+    ----------
+    nframes : int
+        Number of frames in the trajectory.
+    start, stop, step : int, optional
+        Frame selection with slice semantics; step has to be positive. The default is all frames.
+
+    Returns
+    -------
+    frames : range
+        Indices of the selected frames.
+    '''
+    assert step is None or step > 0, "step has to be positive, got {}".format(step)
+    return range(nframes)[start:stop:step]
+
+def _readframes(f, starts, ends):
+    '''Bytes of the frames [starts[i], ends[i]) of the open file f, concatenated; one read if they are contiguous.'''
+    if not len(starts):
+        return b''
+    if np.array_equal(starts[1:], ends[:-1]):
+        f.seek(starts[0])
+        return f.read(ends[-1] - starts[0])
+    chunks = []
+    for a, b in zip(starts, ends):
+        f.seek(a)
+        chunks.append(f.read(b - a))
+    return b''.join(chunks)
+
+def iterblocks(anip, offsets=None, blocksize=1 << 26, frames=None, natoms=None):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    offsets : np.ndarray, optional
+        Frame offsets of anip, see frameindex. The default is None, scanned here.
+    blocksize : int, optional
+        Approximate number of bytes read and converted at once; blocks always hold whole frames.
+        The default is 64 MiB.
+    frames : range, optional
+        Frames to read, see selectframes. The default is None, all frames.
+    natoms : int, optional
+        Number of atoms per frame. The default is None, read from the first line.
+
+    Yields
+    ------
+    first : int
+        Position within frames of the first frame of the block.
+    positions : np.ndarray
+        float32 positions of the next frames of the selection, shape (k, natoms, 3). Only one block is held
+        in memory at a time.
+    '''
+    natoms = natoms if natoms else readnatoms(anip)
+    offsets = offsets if offsets is not None else scanoffsets(anip, natoms)
+    frames = frames if frames is not None else range(len(offsets) - 1)
+    framebytes = (offsets[-1] - offsets[0]) / max(len(offsets) - 1, 1)
+    per = max(int(blocksize // max(framebytes, 1)), 1)
+    idx = np.asarray(frames, dtype=np.int64)
+    with open(anip, 'rb') as f:
+        for a in range(0, len(frames), per):
+            block = idx[a:a + per]
+            yield a, parseblock(_readframes(f, offsets[block], offsets[block + 1]), natoms)
+
+def readani(anip, offsets=None, blocksize=1 << 26, frames=None):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    offsets : np.ndarray, optional
+        Frame offsets of anip, see frameindex. The default is None, scanned here.
+    blocksize : int, optional
+        Approximate number of bytes read and converted at once; blocks always hold whole frames.
+        The default is 64 MiB.
+    frames : range, optional
+        Frames to read, see selectframes. Frames outside the selection are neither parsed nor read,
+        unless they sit between selected frames of the same block. The default is None, all frames.
+
+    Returns
+    -------
+    symbols : np.ndarray
+        Chemical symbols of the atoms, shape (natoms,).
+    positions : np.ndarray
+        float32 positions of the selected frames, shape (len(frames), natoms, 3).
+    '''
+    natoms = readnatoms(anip)
+    offsets = offsets if offsets is not None else scanoffsets(anip, natoms)
+    frames = frames if frames is not None else range(len(offsets) - 1)
+    positions = np.empty((len(frames), natoms, 3), dtype=np.float32)
+    for a, block in iterblocks(anip, offsets, blocksize, frames, natoms):
+        positions[a:a + len(block)] = block
+    return readsymbols(anip), positions
+
+def _parsechunk(anip, dest, starts, ends, first):
+    '''Worker: parse the frames [starts[i], ends[i]) into frames first, first+1, ... of the .npy dest.'''
+    out = np.load(dest, mmap_mode='r+')
+    with open(anip, 'rb') as f:
+        buf = _readframes(f, starts, ends)
+    out[first:first + len(starts)] = parseblock(buf, out.shape[1])
+    out.flush()
+
+def readparallel(anip, offsets, nprocs, dest=None, chunksperproc=4, frames=None):
+    '''
+    Parameters
+    ----------
+    anip : str
+        Path to the .ANI file.
+    offsets : np.ndarray
+        Frame offsets of anip, see frameindex.
+    nprocs : int
+        Number of worker processes.
+    dest : str, optional
+        If given, the positions are written atomically to this .npy file (e.g. cachepath(anip)), otherwise to a
+        temporary file that is removed as soon as it is mapped. The default is None.
+    chunksperproc : int, optional
+        The frames are split into about nprocs*chunksperproc contiguous chunks, for load balancing.
+        The default is 4.
+    frames : range, optional
+        Frames to read, see selectframes. The default is None, all frames.
+
+    Returns
+    -------
+    positions : np.memmap
+        Copy-on-write memory map of the float32 positions, shape (len(frames), natoms, 3). Workers fill disjoint
+        frame ranges of the same file-backed array, so no positions are pickled between processes.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+    natoms = readnatoms(anip)
+    frames = frames if frames is not None else range(len(offsets) - 1)
+    idx = np.asarray(frames, dtype=np.int64)
+    nframes = len(idx)
+    bounds = np.unique(np.linspace(0, nframes, min(nframes, nprocs*chunksperproc) + 1).astype(int))
+    def write(tmp):
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(nframes, natoms, 3))
+        del out
+        with ProcessPoolExecutor(max_workers=nprocs) as pool:
+            futures = [pool.submit(_parsechunk, anip, tmp, offsets[idx[a:b]], offsets[idx[a:b] + 1], a)
+                       for a, b in zip(bounds[:-1], bounds[1:])]
+            for future in futures:
+                future.result()
+    if dest:
+        _atomicwrite(dest, write)
+        return np.load(dest, mmap_mode='c')
+    return _tempmap(anip, write)
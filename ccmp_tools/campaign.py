@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Loading many SIESTA run directories (parameter sweeps, archives) at once.
+"""
+import glob, os
+import numpy as np
+from .md import SiestaSimulation, findfile, _buckets, _matches
+
+#attributes of SiestaSimulation collected for every run
+FDFFIELDS = ('simlabel', 'mdtype', 'simtype', 'natoms', 'nspecies', 'dt', 'nsteps', 'latticeconstant')
+#summary of the .MDE file collected with mde=True
+MDEFIELDS = ('mde_rows', 'last_step', 'T_mean', 'E_tot_first', 'E_tot_last', 'P_mean')
+
+def _isrun(path, fdfext='.fdf'):
+    '''Whether path is a directory holding an FDF file, found as SiestaSimulation finds it (see md.findfile).'''
+    return findfile(path, fdfext, warn=False) is not None
+
+def discover(root, fdfext='.fdf'):
+    '''
+    Parameters
+    ----------
+    root : str
+        Directory searched recursively, or a glob pattern (e.g. 'sweep/T*/run*') matching run directories.
+    fdfext : str, optional
+        Extension of the FDF file that marks a run directory. The default is '.fdf'.
+
+    Returns
+    -------
+    paths : list of str
+        Sorted run directories, i.e. directories holding an FDF file (see ccmp_tools.md.findfile).
+    '''
+    if glob.has_magic(root):
+        return sorted(p for p in glob.glob(root) if os.path.isdir(p) and _isrun(p, fdfext))
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if _matches(_buckets(filenames), fdfext):
+            paths.append(dirpath)
+    return sorted(paths)
+
+def summarize(path, fdfext='.fdf', mde=False, fields=FDFFIELDS):
+    '''
+    Parameters
+    ----------
+    path : str
+        Run directory.
+    fdfext : str, optional
+        Extension of the FDF file. The default is '.fdf'.
+    mde : bool, optional
+        If True, the .MDE file is read as well and summarized (see MDEFIELDS). The default is False.
+    fields : tuple, optional
+        SiestaSimulation attributes to collect. The default is FDFFIELDS.
+
+    Returns
+    -------
+    record : dict
+        'path', 'fdfp' and the fields (and MDEFIELDS) of the run.
+    '''
+    sim = SiestaSimulation(path, fdfext=fdfext)
+    assert sim.fdfp, "no {} file in {}".format(fdfext, path)
+    record = {'path': path, 'fdfp': sim.fdfp}
+    record.update((field, getattr(sim, field)) for field in fields)
+    if mde:
+        sim.iMDE(True)
+        rows = sim.mdefields
+        record.update(mde_rows=len(rows), last_step=rows['step'][-1] if len(rows) else None,
+                      T_mean=rows['T'].mean() if len(rows) else None,
+                      E_tot_first=rows['E_tot'][0] if len(rows) else None,
+                      E_tot_last=rows['E_tot'][-1] if len(rows) else None,
+                      P_mean=rows['P'].mean() if len(rows) else None)
+    return record
+
+def _trysummarize(args):
+    '''Worker: summarize(*args), returning (record, None) or (None, error message) instead of raising.'''
+    try:
+        return summarize(*args), None
+    except Exception as err:
+        return None, '{}: {}'.format(type(err).__name__, err)
+
+class SimulationSet():
+    '''Collection of SIESTA run directories below a common root, loaded in bulk.'''
+    def __init__(self, root, fdfext='.fdf'):
+        '''
+        Parameters
+        ----------
+        root : str
+            Directory searched recursively for run directories, or a glob pattern matching them (see discover).
+        fdfext : str, optional
+            Extension of the FDF file that marks a run directory. The default is '.fdf'.
+
+        Returns
+        -------
+        None. Sets self.paths to the discovered run directories; nothing is read until load().
+        '''
+        self.root = root
+        self.fdfext = fdfext
+        self.paths = discover(root, fdfext)
+        self.records = []
+        self.failures = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        '''Yields a (lazily resolved) SiestaSimulation for every run directory.'''
+        for path in self.paths:
+            yield SiestaSimulation(path, fdfext=self.fdfext)
+
+    def load(self, mde=False, nprocs=None, chunksize=16):
+        '''
+        Parameters
+        ----------
+        mde : bool, optional
+            If True, every run's .MDE file is read and summarized as well. The default is False.
+        nprocs : int, optional
+            Number of worker processes; 1 loads in this process. The default is None, os.cpu_count().
+        chunksize : int, optional
+            Number of directories handed to a worker at once. The default is 16.
+
+        Returns
+        -------
+        table : np.ndarray
+            Structured summary, see table(). self.records holds one dict per successfully loaded run and
+            self.failures maps the paths of runs that could not be loaded, or that have values of the wrong type,
+            to the error, so that one broken directory does not abort the batch.
+        '''
+        args = [(path, self.fdfext, mde) for path in self.paths]
+        nprocs = nprocs if nprocs else os.cpu_count()
+        if nprocs > 1 and len(args) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=nprocs) as pool:
+                results = list(pool.map(_trysummarize, args, chunksize=chunksize))
+        else:
+            results = [_trysummarize(a) for a in args]
+        self.records = [record for record, error in results if record is not None]
+        self.failures = {path: error for path, (record, error) in zip(self.paths, results) if error is not None}
+        return self.table()
+
+    def table(self):
+        '''
+        Returns
+        -------
+        table : np.ndarray
+            Structured array with one row per loaded run: 'path', 'simlabel', 'mdtype' and 'simtype' as objects,
+            the remaining FDFFIELDS (and MDEFIELDS, if loaded) as float64 with NaN for missing values.
+            Values that are not numbers (e.g. 'NumberOfAtoms three') are NaN as well, and the error is added
+            to self.failures under the run's path.
+        '''
+        fields = ['path'] + list(FDFFIELDS)
+        if self.records and 'mde_rows' in self.records[0]:
+            fields += list(MDEFIELDS)
+        text = ('path', 'simlabel', 'mdtype', 'simtype')
+        table = np.empty(len(self.records), dtype=[(f, object if f in text else np.float64) for f in fields])
+        for i, record in enumerate(self.records):
+            for f in fields:
+                if f in text:
+                    table[f][i] = record[f]
+                    continue
+                try:
+                    table[f][i] = np.nan if record[f] is None else float(record[f])
+                except (TypeError, ValueError) as err:
+                    table[f][i] = np.nan
+                    self.failures[record['path']] = '{}: {}: {}'.format(type(err).__name__, f, err)
+        return table
+
+    def dataframe(self):
+        '''The summary table as a pandas.DataFrame (pandas is only needed for this).'''
+        import pandas as pd
+        return pd.DataFrame.from_records(self.records)
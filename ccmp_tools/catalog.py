@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent SQLite catalog of the FDF metadata of many SIESTA runs.
+"""
+import fnmatch, glob, json, os, sqlite3
+from . import fdf as fdftools
+from .campaign import discover, _isrun, _trysummarize
+from .md import findfile
+
+#SiestaSimulation attributes stored for every run, with their SQL column types
+COLUMNS = (('simlabel', 'TEXT'), ('mdtype', 'TEXT'), ('simtype', 'TEXT'), ('natoms', 'INTEGER'),
+           ('nspecies', 'INTEGER'), ('dt', 'REAL'), ('istep', 'INTEGER'), ('fstep', 'INTEGER'),
+           ('nsteps', 'INTEGER'), ('temperature', 'REAL'), ('latticeconstant', 'REAL'),
+           ('latticevectors', 'TEXT'), ('chemspeclab', 'TEXT'))
+#stored as JSON text
+_JSON = ('latticevectors', 'chemspeclab')
+#columns with an index for fast lookups
+_INDEXED = ('mdtype', 'simtype', 'natoms', 'temperature', 'simlabel')
+
+class Catalog():
+    '''SQLite-backed table of run metadata, keyed by run directory and updated incrementally.'''
+    def __init__(self, dbpath):
+        '''
+        Parameters
+        ----------
+        dbpath : str
+            SQLite database file; created if it does not exist.
+
+        Returns
+        -------
+        None. Opens (and if needed creates) the 'runs' table, with one row per run directory holding
+        the FDF path, its size and modification time, those of the files it includes (as JSON 'stamp'),
+        the COLUMNS and the error of a failed parse.
+        '''
+        self.dbpath = dbpath
+        self.db = sqlite3.connect(dbpath)
+        self.db.row_factory = sqlite3.Row
+        #several readers can query while a campaign is being catalogued
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS runs (path TEXT PRIMARY KEY, fdfp TEXT, size INTEGER, '
+                        'mtime INTEGER, error TEXT, {}, stamp TEXT)'
+                        .format(', '.join('{} {}'.format(*c) for c in COLUMNS)))
+        #catalogs of older versions lack the stamp, their runs are parsed again once
+        if 'stamp' not in [row['name'] for row in self.db.execute('PRAGMA table_info(runs)')]:
+            self.db.execute('ALTER TABLE runs ADD COLUMN stamp TEXT')
+        for column in _INDEXED:
+            if dict(COLUMNS)[column] == 'TEXT':
+                #find() compares text case-insensitively, which only an index with the same collation serves;
+                #catalogs of older versions have a binary one
+                self.db.execute('DROP INDEX IF EXISTS runs_{}'.format(column))
+                self.db.execute('CREATE INDEX IF NOT EXISTS runs_{0}_nocase ON runs ({0} COLLATE NOCASE)'
+                                .format(column))
+            else:
+                self.db.execute('CREATE INDEX IF NOT EXISTS runs_{0} ON runs ({0})'.format(column))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def _stale(self, paths, fdfext):
+        '''
+        (path, fdfp, stamp) of the runs in paths that are new or whose FDF or included files changed since
+        cataloguing, see ccmp_tools.fdf.FDFCache, and the number of paths that hold a run.
+        '''
+        known = {row['path']: (row['fdfp'], row['stamp'])
+                 for row in self.db.execute('SELECT path, fdfp, stamp FROM runs')}
+        stale = []
+        runs = 0
+        for path in paths:
+            #a listed run directory may be gone, in which case prune removes its row
+            fdfp = findfile(path, fdfext, 'fdfp')
+            if fdfp is None:
+                continue
+            row = known.get(path)
+            if row and row[0] == fdfp and row[1]:
+                #an unchanged FDF includes the same files, which are only stat'ed
+                stamp = tuple(tuple(s) for s in json.loads(row[1]))
+                if fdftools._stamp(p for p, size, mtime in stamp) == stamp:
+                    runs += 1
+                    continue
+            try:
+                stamp = fdftools._stamp([fdfp] + fdftools.includes(fdfp))
+            except FileNotFoundError:
+                continue
+            runs += 1
+            stale.append((path, fdfp, stamp))
+        return stale, runs
+
+    def update(self, root, fdfext='.fdf', nprocs=None, chunksize=16, prune=False):
+        '''
+        Parameters
+        ----------
+        root : str or list of str
+            Directory or glob pattern searched for runs (see ccmp_tools.campaign.discover), or a list of run
+            directories.
+        fdfext : str, optional
+            Extension of the FDF file. The default is '.fdf'.
+        nprocs : int, optional
+            Number of processes parsing the new or changed FDFs; 1 parses in this process.
+            The default is None, os.cpu_count().
+        chunksize : int, optional
+            Number of runs handed to a worker at once. The default is 16.
+        prune : bool, optional
+            If True, rows of runs below root, matching the glob pattern root, or in the list, whose directory
+            no longer exists or no longer holds an FDF are deleted. The default is False.
+
+        Returns
+        -------
+        counts : dict
+            Number of 'parsed', 'failed', 'unchanged' and 'removed' runs. Only runs whose FDF path, or size or
+            modification time of the FDF or a file it includes, differ from the catalog are parsed; failures
+            are stored with their error so that they are not retried until these files change.
+        '''
+        paths = discover(root, fdfext) if isinstance(root, str) else sorted(root)
+        stale, runs = self._stale(paths, fdfext)
+        fields = tuple(c for c, t in COLUMNS)
+        args = [(path, fdfext, False, fields) for path, fdfp, stamp in stale]
+        nprocs = nprocs if nprocs else os.cpu_count()
+        if nprocs > 1 and len(args) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=nprocs) as pool:
+                results = list(pool.map(_trysummarize, args, chunksize=chunksize))
+        else:
+            results = [_trysummarize(a) for a in args]
+        rows = []
+        for (path, fdfp, stamp), (record, error) in zip(stale, results):
+            values = [record.get(c) if record else None for c in fields]
+            values = [json.dumps(v.tolist() if hasattr(v, 'tolist') else v) if c in _JSON and v is not None else v
+                      for c, v in zip(fields, values)]
+            rows.append([path, fdfp, stamp[0][1], stamp[0][2], error] + values + [json.dumps(stamp)])
+        columns = ('path', 'fdfp', 'size', 'mtime', 'error') + fields + ('stamp',)
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO runs ({}) VALUES ({})'
+                                .format(', '.join(columns), ', '.join('?'*len(columns))), rows)
+            removed = 0
+            if prune:
+                if isinstance(root, str):
+                    found = set(paths)
+                    #paths() selects by the fixed prefix of a glob, the rest of the pattern has to match too
+                    candidates = [p for p in self.paths(root) if p not in found
+                                  and (not glob.has_magic(root) or fnmatch.fnmatch(p, root))]
+                else:
+                    candidates = root
+                gone = set(p for p in candidates if not _isrun(p, fdfext))
+                self.db.executemany('DELETE FROM runs WHERE path = ?', [(p,) for p in gone])
+                removed = len(gone)
+        failed = sum(error is not None for record, error in results)
+        return {'parsed': len(stale) - failed, 'failed': failed, 'unchanged': runs - len(stale),
+                'removed': removed}
+
+    def paths(self, root=''):
+        '''Catalogued run directories below the directory root, or starting with the fixed part of a glob pattern.'''
+        if glob.has_magic(root):
+            prefix = root[:min(root.find(c) for c in '*?[' if c in root)]
+        else:
+            prefix = os.path.join(root, '') if root else ''
+        return [row[0] for row in self.db.execute('SELECT path FROM runs WHERE path = ? OR substr(path, 1, ?) = ? '
+                                                  'ORDER BY path', (root, len(prefix), prefix))]
+
+    def find(self, errors=False, **criteria):
+        '''
+        Parameters
+        ----------
+        errors : bool, optional
+            If True, runs whose FDF could not be parsed are included. The default is False.
+        **criteria
+            Column=value pairs that all have to hold, e.g. mdtype='Nose', temperature=350, natoms=128.
+            Text metadata columns compare case-insensitively, path and fdfp exactly; a tuple (low, high) selects
+            an inclusive range.
+
+        Returns
+        -------
+        runs : list of dict
+            Matching rows, with latticevectors and chemspeclab decoded from JSON.
+        '''
+        names = dict(COLUMNS)
+        clauses = [] if errors else ['error IS NULL']
+        params = []
+        for column, value in criteria.items():
+            assert column in names or column in ('path', 'fdfp'), "unknown catalog column {}".format(column)
+            if isinstance(value, tuple):
+                clauses.append('{} BETWEEN ? AND ?'.format(column))
+                params.extend(value)
+            elif value is None:
+                clauses.append('{} IS NULL'.format(column))
+            else:
+                collate = ' COLLATE NOCASE' if names.get(column) == 'TEXT' else ''
+                clauses.append('{} = ?{}'.format(column, collate))
+                params.append(value)
+        sql = 'SELECT * FROM runs' + (' WHERE ' + ' AND '.join(clauses) if clauses else '') + ' ORDER BY path'
+        return self.query(sql, params)
+
+    def query(self, sql, params=()):
+        '''
+        Parameters
+        ----------
+        sql : str
+            Any SQL query on the 'runs' table.
+        params : sequence, optional
+            Parameters for the ? placeholders of sql. The default is ().
+
+        Returns
+        -------
+        rows : list of dict
+            Result rows, with JSON columns decoded.
+        '''
+        rows = []
+        for row in self.db.execute(sql, params):
+            row = dict(row)
+            for column in _JSON:
+                if row.get(column) is not None:
+                    row[column] = json.loads(row[column])
+            rows.append(row)
+        return rows
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Utilities for SIESTA FDF input files: a minimal reader and a process-wide cache of looked-up values.
+"""
+import atexit, copy, os, pickle, re
+from collections import OrderedDict
+from . import ani as anitools
+
+#'%include file', 'key < file' and '%block name < file' pull in other files
+_INCLUDE = re.compile(rb'^\s*%include\s+(\S+)|<\s*(\S+)\s*$', re.IGNORECASE | re.MULTILINE)
+
+def includes(fdfp):
+    '''
+    Parameters
+    ----------
+    fdfp : str
+        Path to the FDF file.
+
+    Returns
+    -------
+    paths : list of str
+        Absolute paths of the existing files fdfp includes, directly or through other included files,
+        relative paths being resolved against the directory of the including file.
+    '''
+    seen = [os.path.abspath(fdfp)]
+    todo = [seen[0]]
+    while todo:
+        path = todo.pop()
+        with open(path, 'rb') as f:
+            text = f.read()
+        for match in _INCLUDE.finditer(text):
+            name = os.fsdecode(match.group(1) or match.group(2))
+            name = os.path.join(os.path.dirname(path), name)
+            name = os.path.abspath(name)
+            if name not in seen and os.path.isfile(name):
+                seen.append(name)
+                todo.append(name)
+    return seen[1:]
+
+#SI value of the units of physical FDF values, taken from sisl's SIESTA table (CODATA 2018) so that both readers agree;
+#the first unit of every group is the one values are converted to by default, as in sisl
+_GROUPS = {
+    'mass': (('amu', 1.6605390666e-27), ('kg', 1.), ('g', 1e-3)),
+    'length': (('Ang', 1e-10), ('m', 1.), ('cm', 1e-2), ('nm', 1e-9), ('pm', 1e-12), ('Bohr', 5.29177210903e-11)),
+    'time': (('fs', 1e-15), ('s', 1.), ('ns', 1e-9), ('ps', 1e-12), ('atu', 2.4188843265857e-17)),
+    'energy': (('eV', 1.602176634e-19), ('meV', 1.602176634e-19 / 1e3), ('J', 1.), ('kJ', 1e3), ('cal', 4.184),
+               ('kcal', 4184.), ('K', 1.380649e-23), ('Ry', 2.1798723611035e-18), ('mRy', 2.1798723611035e-21),
+               ('Ha', 4.3597447222071e-18), ('mHa', 4.3597447222071e-21), ('Hartree', 4.3597447222071e-18),
+               ('cm**-1', 1.9864458569999998e-23), ('invcm', 1.9864458569999998e-23)),
+    'pressure': (('eV/Ang**3', 1.602176634e-19 / 1e-30), ('Pa', 1.), ('GPa', 1e9), ('atm', 101325.), ('bar', 1e5),
+                 ('kbar', 1e8), ('Mbar', 1e11), ('Ry/Bohr**3', 2.1798723611035e-18 / 5.29177210903e-11**3),
+                 ('Ha/Bohr**3', 4.3597447222071e-18 / 5.29177210903e-11**3)),
+}
+#unit name (lower case, FDF units are case-insensitive) -> (group, SI value)
+UNITS = {name.lower(): (group, value) for group, units in _GROUPS.items() for name, value in units}
+UNITS.update({name.replace('**', '^'): v for name, v in UNITS.items() if '**' in name})
+_LOGICAL_TRUE = ('.true.', 'true', 'yes', 'y', 't')
+_LOGICAL = _LOGICAL_TRUE + ('.false.', 'false', 'no', 'n', 'f')
+
+def _label(label):
+    '''FDF labels ignore case and the characters '-', '_' and '.'.'''
+    return label.lower().replace('_', '').replace('-', '').replace('.', '')
+
+_COMMENT = re.compile('[#!;]')
+
+def _content(line):
+    '''line without its comment ('#', '!' or ';' to the end of the line) and surrounding whitespace.'''
+    if '#' in line or '!' in line or ';' in line:
+        line = _COMMENT.split(line, maxsplit=1)[0]
+    return line.strip()
+
+def convert(value, fromunit, tounit=None):
+    '''
+    Parameters
+    ----------
+    value : float
+        Physical value in fromunit.
+    fromunit : str
+        Unit of value, see UNITS.
+    tounit : str, optional
+        Unit to convert to; it has to measure the same quantity. The default is None, the default unit
+        of the group (Ang, fs, eV, amu or eV/Ang**3).
+
+    Returns
+    -------
+    value : float
+        value in tounit. Unknown units and units of different quantities raise a ValueError.
+    '''
+    if fromunit.lower() not in UNITS or (tounit and tounit.lower() not in UNITS):
+        raise ValueError("unknown unit {} or {}".format(fromunit, tounit))
+    group, si = UNITS[fromunit.lower()]
+    togroup, tosi = UNITS[tounit.lower()] if tounit else (group, _GROUPS[group][0][1])
+    if group != togroup:
+        raise ValueError("cannot convert {} ({}) to {} ({})".format(fromunit, group, tounit, togroup))
+    return value * (si / tosi)
+
+class FDFReader():
+    '''Minimal FDF reader covering what SiestaSimulation looks up, returning the same values as sisl's fdf sile.'''
+    def __init__(self, fdfp):
+        '''
+        Parameters
+        ----------
+        fdfp : str
+            Path to the FDF file.
+
+        Returns
+        -------
+        None. Reads fdfp (following '%include file') once into self.values, mapping each normalized label
+        to the text after it, the list of lines of a %block, or a ('<', file) redirection for 'label < file';
+        the first occurrence of a label wins, as in SIESTA. self.files lists the files that were read.
+        '''
+        self.fdfp = fdfp
+        self.values = {}
+        self.files = []
+        self._parse(os.path.abspath(fdfp))
+
+    def _parse(self, path):
+        self.files.append(path)
+        base = os.path.dirname(path)
+        with open(path) as f:
+            lines = iter(f.read().splitlines())
+        for line in lines:
+            line = _content(line)
+            if not line:
+                continue
+            words = line.split(maxsplit=1)
+            first = words[0].lower()
+            rest = words[1] if len(words) > 1 else ''
+            if first == '%include':
+                name = os.path.abspath(os.path.join(base, rest))
+                if os.path.isfile(name) and name not in self.files:
+                    self._parse(name)
+            elif first == '%block' and rest:
+                name, pipe, source = rest.partition('<')
+                if pipe:
+                    with open(os.path.join(base, source.strip())) as f:
+                        block = [l for l in (_content(l) for l in f) if l]
+                else:
+                    block = []
+                    for l in lines:
+                        l = _content(l)
+                        if l.lower().startswith('%endblock'):
+                            break
+                        if l:
+                            block.append(l)
+                self.values.setdefault(_label(name.split()[0]), block)
+            elif '<' in rest:
+                labels, pipe, source = rest.partition('<')
+                for label in [words[0]] + labels.split():
+                    self.values.setdefault(_label(label), ('<', os.path.join(base, source.strip())))
+            else:
+                self.values.setdefault(_label(words[0]), rest)
+
+    def get(self, label, default=None, unit=None):
+        '''
+        Parameters
+        ----------
+        label : str
+            FDF label or block name (case, '-', '_' and '.' are ignored).
+        default : optional
+            Returned if label is absent; if given, numbers are cast to its type. The default is None.
+        unit : str, optional
+            Unit to convert a physical value to. The default is None, the default unit of its quantity.
+
+        Returns
+        -------
+        value
+            list of str for a block, bool for a logical, int or float for a number (float if it has a
+            decimal point or an exponent), the converted float for '<number> <unit>', and the text otherwise.
+        '''
+        value = self.values.get(_label(label))
+        if value is None:
+            return default
+        if isinstance(value, tuple):
+            return FDFReader(value[1]).get(label, default, unit)
+        if isinstance(value, list):
+            return list(value)
+        words = value.split()
+        if len(words) == 1:
+            word = words[0].lower()
+            if word in _LOGICAL:
+                return word in _LOGICAL_TRUE
+            try:
+                number = int(word)
+            except ValueError:
+                try:
+                    number = float(word)
+                except ValueError:
+                    return value
+            return type(default)(number) if default is not None else number
+        if len(words) == 2:
+            try:
+                number = float(words[0])
+            except ValueError:
+                return value
+            return convert(number, words[1], unit)
+        return value
+
+def _stamp(paths):
+    '''((path, size, mtime in ns), ...) of paths; a missing file gets size and mtime None.'''
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((path, st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+class FDFCache():
+    '''LRU cache of FDF values, valid as long as neither the FDF nor any file it includes changes.'''
+    def __init__(self, maxsize=256, path=None):
+        '''
+        Parameters
+        ----------
+        maxsize : int, optional
+            Number of FDF files whose values are kept; the least recently used one is evicted first.
+            The default is 256.
+        path : str, optional
+            Pickle file the cache is loaded from (if it exists) and saved to by save(). The default is None,
+            in memory only.
+
+        Returns
+        -------
+        None.
+        '''
+        self.maxsize = maxsize
+        self.path = path
+        #absolute fdf path -> (stamp of the fdf and its includes, {(key, unit, reader): value})
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def values(self, fdfp):
+        '''
+        Parameters
+        ----------
+        fdfp : str
+            Path to the FDF file.
+
+        Returns
+        -------
+        values : dict
+            The cached {(key, unit, reader): value} of fdfp, emptied first if the file or one of its includes changed.
+            Only the stored files are stat'ed; the FDF is re-scanned for includes only when something changed.
+        '''
+        fdfp = os.path.abspath(fdfp)
+        entry = self.entries.get(fdfp)
+        if entry is None or _stamp(p for p, size, mtime in entry[0]) != entry[0]:
+            entry = (_stamp([fdfp] + includes(fdfp)), {})
+            self.entries[fdfp] = entry
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        self.entries.move_to_end(fdfp)
+        return entry[1]
+
+    def get(self, fdfp, key, unit, read, reader=None):
+        '''
+        Parameters
+        ----------
+        fdfp : str
+            Path to the FDF file.
+        key : str
+            FDF key (or block name).
+        unit : str
+            Unit the value was requested in, None for the default.
+        read : callable
+            Called without arguments to read the value when it is not cached.
+        reader : str, optional
+            Name of the reader behind read, e.g. 'builtin' or 'sisl'. Values of different readers are cached
+            separately. The default is None.
+
+        Returns
+        -------
+        value
+            The (cached) value, as a copy so that callers cannot modify the cache.
+        '''
+        values = self.values(fdfp)
+        entry = (key, unit, reader)
+        if entry in values:
+            self.hits += 1
+        else:
+            self.misses += 1
+            values[entry] = read()
+        return copy.deepcopy(values[entry])
+
+    def load(self, path=None):
+        '''Add the entries pickled in path (default self.path); stale ones are dropped on first use.'''
+        with open(path if path else self.path, 'rb') as f:
+            self.entries.update(pickle.load(f))
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def save(self, path=None):
+        '''Pickle the entries to path (default self.path), replacing the file atomically.'''
+        path = path if path else self.path
+        if not path:
+            return
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                pickle.dump(self.entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        anitools._atomicwrite(path, write)
+
+#shared by all SiestaSimulation objects of the process
+CACHE = FDFCache()
+
+def configure(maxsize=None, path=None):
+    '''
+    Parameters
+    ----------
+    maxsize : int, optional
+        New size of the shared cache. The default is None, unchanged.
+    path : str, optional
+        Pickle file to persist the shared cache in: entries are loaded from it now and it is written
+        at interpreter exit (or with CACHE.save()). The default is None, unchanged.
+
+    Returns
+    -------
+    cache : FDFCache
+        The shared cache.
+    '''
+    if maxsize:
+        CACHE.maxsize = maxsize
+    if path:
+        if not CACHE.path:
+            atexit.register(lambda: CACHE.save())
+        CACHE.path = path
+        if os.path.exists(path):
+            CACHE.load(path)
+    return CACHE
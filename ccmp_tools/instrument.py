@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-stage timing, I/O and memory records of simulation loading.
+"""
+import logging, os, sys, time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+def bytesread():
+    '''Bytes read by this process so far ('rchar' of /proc/self/io), or None where that is not available.'''
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def peakrss():
+    '''Peak resident set size of this process so far in bytes, or None where the resource module is not available.'''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak*1024
+
+def availablememory():
+    '''Physical memory available to new allocations in bytes (/proc/meminfo MemAvailable, else free pages) or None.'''
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])*1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+class Stages():
+    '''Records of the stages of a load, as timed by the stage() context manager.'''
+    def __init__(self):
+        #one dict per finished stage, in the order they finished
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, **info):
+        '''
+        Parameters
+        ----------
+        name : str
+            Stage name, e.g. 'iMD.universe'.
+        **info
+            Extra items stored in the record, e.g. the path that is read.
+
+        Returns
+        -------
+        record : contextmanager
+            Appends {'stage', 'seconds', 'bytes_read', 'peak_rss', 'peak_rss_growth', **info} to self.records
+            when the block ends (also when it raises), and logs it at DEBUG level. bytes_read counts the bytes
+            read by the process during the stage (memory-mapped pages are not included); peak_rss is the
+            process's peak resident memory after it, and peak_rss_growth how much the stage raised that peak.
+        '''
+        rss0 = peakrss()
+        read0 = bytesread()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            read1 = bytesread()
+            rss1 = peakrss()
+            record = {'stage': name, 'seconds': seconds,
+                      'bytes_read': read1 - read0 if read0 is not None and read1 is not None else None,
+                      'peak_rss': rss1, 'peak_rss_growth': rss1 - rss0 if rss0 is not None else None}
+            record.update(info)
+            self.records.append(record)
+            log.debug(self.format(record))
+
+    @staticmethod
+    def format(record):
+        '''One-line summary of a record.'''
+        mb = lambda b: 'n/a' if b is None else '{:.1f} MB'.format(b / 1e6)
+        return '{:<20}{:10.4f} s  read {:>10}  peak RSS {:>10} (+{})'.format(
+            record['stage'], record['seconds'], mb(record['bytes_read']), mb(record['peak_rss']),
+            mb(record['peak_rss_growth']))
+
+    def report(self):
+        '''
+        Returns
+        -------
+        report : str
+            The records as a table, one stage per line, in the order they finished.
+        '''
+        return '\n'.join(self.format(r) for r in self.records)
+
+    def totals(self):
+        '''
+        Returns
+        -------
+        totals : dict
+            Stage name -> (number of times run, total seconds, total bytes read).
+        '''
+        totals = {}
+        for r in self.records:
+            n, seconds, read = totals.get(r['stage'], (0, 0., 0))
+            totals[r['stage']] = (n + 1, seconds + r['seconds'], read + (r['bytes_read'] or 0))
+        return totals
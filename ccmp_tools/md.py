@@ -5,10 +5,192 @@ Created on Wed Jun 10 20:50:35 2020
 
 @author: awills
 """
-import sisl, os, sys
-from tqdm import tqdm
+import logging, os, time
+from contextlib import nullcontext
+from functools import cached_property
 import numpy as np
-import MDAnalysis as MD
+from . import ani as anitools
+from . import mde as mdetools
+from . import fdf as fdftools
+from . import instrument as instrumenttools
+from . import mdhistory as mdhistorytools
+from . import out as outtools
+
+log = logging.getLogger(__name__)
+
+#memory budget in bytes for positions iMD loads into memory; None is half the physical memory available at the time
+BUDGET = None
+
+def _primexyz(trajectory, offsets):
+    '''
+    Parameters
+    ----------
+    trajectory : MDAnalysis.coordinates.base.ProtoReader
+        Trajectory of an .ANI Universe.
+    offsets : np.ndarray
+        Frame offsets of the same file, see ccmp_tools.ani.frameindex.
+
+    Returns
+    -------
+    None. If trajectory is an XYZReader, its frame offsets and n_frames are filled from offsets,
+    which saves the line-by-line scan it otherwise does on first use of n_frames or random access.
+    '''
+    from MDAnalysis.coordinates.XYZ import XYZReader
+    if isinstance(trajectory, XYZReader):
+        trajectory._offsets = offsets[:-1].tolist()
+        trajectory._cache['n_frames'] = len(offsets) - 1
+
+def _frameblocks(trajectory, chunk=256, start=None, stop=None, step=None):
+    '''
+    Parameters
+    ----------
+    trajectory : MDAnalysis.coordinates.base.ProtoReader
+        Trajectory to gather frames from.
+    chunk : int, optional
+        Maximum number of frames per block. The default is 256.
+    start, stop, step : int, optional
+        Frame selection, with the same meaning as slicing the trajectory. The default is the full trajectory.
+
+    Yields
+    ------
+    block : np.ndarray
+        float32 array of shape (k, natoms, 3) with k <= chunk positions of consecutive selected frames.
+        For an in-memory trajectory the blocks are views of its coordinate array, otherwise they are copied
+        into a buffer that is reused between blocks; copy a block if it has to outlive the iteration.
+    '''
+    coordinates = getattr(trajectory, 'coordinate_array', None)
+    if coordinates is not None and getattr(trajectory, 'stored_order', None) == 'fac':
+        yield from _rangeblocks(coordinates, range(len(coordinates))[start:stop:step], chunk)
+        return
+    buf = np.empty((chunk, trajectory.n_atoms, 3), dtype=np.float32)
+    k = 0
+    for ts in trajectory[start:stop:step]:
+        buf[k] = ts.positions
+        k += 1
+        if k == chunk:
+            yield buf
+            k = 0
+    if k:
+        yield buf[:k]
+
+def _rangeblocks(array, frames, chunk=256):
+    '''
+    Parameters
+    ----------
+    array : np.ndarray
+        Array whose first axis runs over frames.
+    frames : range
+        Indices of the selected frames.
+    chunk : int, optional
+        Maximum number of frames per block. The default is 256.
+
+    Yields
+    ------
+    block : np.ndarray
+        Views array[frames[a:a + chunk]] of consecutive selected frames, taken by slicing without a copy.
+    '''
+    for a in range(0, len(frames), chunk):
+        block = frames[a:a + chunk]
+        #a descending range may end before index 0, which a slice can only express as None
+        yield array[block.start:block.stop if block.stop >= 0 else None:block.step]
+
+def _extend(buf, used, rows):
+    '''
+    Parameters
+    ----------
+    buf : np.ndarray or None
+        Growable buffer whose first used entries are in use.
+    used : int
+        Number of entries of buf in use.
+    rows : np.ndarray
+        Entries to append, with the same trailing shape and dtype as buf.
+
+    Returns
+    -------
+    buf : np.ndarray
+        buf with rows copied in after the used entries. When it is full, it is replaced by one of twice
+        the size, so that appending n entries in total costs O(n) copies however often it is called.
+    '''
+    if buf is None or used + len(rows) > len(buf):
+        grown = np.empty((max(2*len(buf) if buf is not None else 0, used + len(rows)),) + rows.shape[1:],
+                         dtype=rows.dtype)
+        if used:
+            grown[:used] = buf[:used]
+        buf = grown
+    buf[used:used + len(rows)] = rows
+    return buf
+
+def _buckets(names):
+    '''File names sorted and keyed by their lower-cased extension (e.g. '.ani'), see Simulation._dirindex.'''
+    buckets = {}
+    for name in names:
+        buckets.setdefault(os.path.splitext(name)[1].lower(), []).append(name)
+    for names in buckets.values():
+        names.sort()
+    return buckets
+
+def _matches(buckets, fext):
+    '''
+    Parameters
+    ----------
+    buckets : dict
+        File names of a directory keyed by extension, see _buckets.
+    fext : str
+        The extension of the file to find.
+
+    Returns
+    -------
+    matches : list of str
+        Sorted names with extension fext (case-insensitive). Only if there are none, names merely containing
+        fext are considered, ignoring the .npy caches and indexes of ccmp_tools.ani.
+    '''
+    matches = buckets.get(fext.lower(), [])
+    if not matches:
+        matches = sorted(i for names in buckets.values() for i in names
+                         if fext.lower() in i.lower() and not anitools.issidecar(i))
+    return matches
+
+def _pick(matches, path, fext, attr):
+    '''First of matches as a path in directory path, or None; logs ambiguous and missing files as _filefind does.'''
+    if len(matches) > 1:
+        log.warning("ambiguous %s: %d files ending in %s in %s, using %s", attr, len(matches), fext, path, matches[0])
+    if not matches:
+        log.warning("attribute not found: %s ending in %s in %s", attr, fext, path)
+        return None
+    return os.path.join(path, matches[0])
+
+def findfile(path, fext, attr=None, warn=True):
+    '''
+    Parameters
+    ----------
+    path : str
+        Directory to look in.
+    fext : str
+        The extension of the file to find.
+    attr : str, optional
+        Name of the file's role in log messages, e.g. 'mdep'. The default is None, fext.
+    warn : bool, optional
+        If True, a choice between several matching files is logged. The default is True.
+
+    Returns
+    -------
+    filepath : str or None
+        The file Simulation._filefind would pick in path (see _matches), or None if there is none or path
+        is not a directory. Lets code without a Simulation object, e.g. campaign discovery, the catalog and
+        the monitor, find the same files.
+    '''
+    try:
+        with os.scandir(path) as entries:
+            matches = _matches(_buckets(e.name for e in entries if e.is_file()), fext)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if not matches:
+        return None
+    if warn and len(matches) > 1:
+        log.warning("ambiguous %s: %d files ending in %s in %s, using %s", attr if attr else fext, len(matches),
+                    fext, path, matches[0])
+    return os.path.join(path, matches[0])
+
 
 class Simulation():
     '''Base class to build other simulations from, primarily for utility functions
@@ -16,7 +198,39 @@ class Simulation():
     '''
     def __init__(self):
         pass
-    
+
+    def _stage(self, name, **info):
+        '''Context manager recording stage name in self.stages if instrumentation is on (see ccmp_tools.instrument).'''
+        stages = self.__dict__.get('stages')
+        return stages.stage(name, **info) if stages is not None else nullcontext()
+
+    def _dirindex(self, refresh=False):
+        '''
+        Parameters
+        ----------
+        refresh : bool, optional
+            If True, the directory is scanned again even if its modification time did not change.
+            The default is False.
+
+        Returns
+        -------
+        buckets : dict
+            Names of the files in self.path, sorted, keyed by their lower-cased extension (e.g. '.ani').
+            The index is built with a single os.scandir and kept in self._index together with the modification
+            time of self.path, so later lookups only cost a stat until files are added, removed or renamed.
+        '''
+        index = getattr(self, '_index', None)
+        mtime = os.stat(self.path).st_mtime_ns
+        if refresh or index is None or index[0] != mtime:
+            with os.scandir(self.path) as entries:
+                buckets = _buckets(entry.name for entry in entries if entry.is_file())
+            self._index = (mtime, buckets)
+        return self._index[1]
+
+    def refresh(self):
+        '''Rescan self.path, e.g. after files were replaced within the modification time resolution.'''
+        self._dirindex(refresh=True)
+
     def _filefind(self, attrp, fext, attr):
         '''
         Parameters
@@ -32,6 +246,10 @@ class Simulation():
                     the method searches self.path for the file extension and assumes whatever is found is the file desired
                     and sets os.path.join(self.path, the first file with matching extension found)
                     If the file is not found, an error is caught and self.attr is set to None
+                    Files are looked up in the directory index (see _dirindex). Files with extension fext are
+                    preferred; only if there are none, names merely containing fext are considered
+                    (ignoring the .npy caches of ccmp_tools.ani). If several files match, the first in sorted
+                    order is used and the ambiguity is reported.
         fext : str
             The extension of the file to find.
         attr : str
@@ -45,24 +263,37 @@ class Simulation():
         #if attr is non-false, look for it in sim directory
         if attrp:
             #if fext in attr, assume filename
-            if (type(attrp) == str) and (fext in attrp):
-                self.__setattr__(attr, os.path.join(self.path, attrp) if type(attrp)==str and fext in attrp.lower() else None)
+            if (type(attrp) == str) and (fext.lower() in attrp.lower()):
+                self.__setattr__(attr, os.path.join(self.path, attrp))
             #else if just T/non-F, look for it
             else:
-                try:
-                    self.__setattr__(attr, os.path.join(self.path,
-                                                        [i for i in os.listdir(self.path) if fext.lower() in i.lower()][0]))
-                except IndexError:
-                    #if there is no zero index, empty list and file not found
-                    print("attribute not found: {} ending in {}".format(attr, fext))
-                    self.__setattr__(attr, None)
+                self.__setattr__(attr, _pick(_matches(self._dirindex(), fext), self.path, fext, attr))
         else:
             #keep whatever false value
             self.__setattr__(attr, None)
     
 
+def _fdfkey(key, unit=None):
+    '''
+    Parameters
+    ----------
+    key : str
+        FDF key to look up.
+    unit : str, optional
+        Unit to convert a physical value to. The default is None, sisl's default unit.
+
+    Returns
+    -------
+    attribute : functools.cached_property
+        Property resolving to self._fdfget(key, unit) on first access.
+    '''
+    def get(self):
+        return self._fdfget(key, unit)
+    get.__doc__ = "Value of the FDF key {}, read on first access (None if absent or without FDF).".format(key)
+    return cached_property(get)
+
 class SiestaSimulation(Simulation):
-    def __init__(self, path, fdfb=True, fdfext='.fdf'):
+    def __init__(self, path, fdfb=True, fdfext='.fdf', fdfreader='builtin', instrument=False):
         '''
         Parameters
         ----------
@@ -74,6 +305,14 @@ class SiestaSimulation(Simulation):
             The default is True.
         fdfext : str, optional
             The extension for your FDF file, if not standard. The default is '.fdf'.
+        fdfreader : str, optional
+            'builtin' reads the FDF attributes with ccmp_tools.fdf.FDFReader, falling back to sisl for
+            anything it cannot handle; 'sisl' always uses sisl. The default is 'builtin'.
+        instrument : bool, optional
+            If True, wall time, bytes read and peak RSS of every loading stage (finding and reading the FDF,
+            and the stages of iMD and iMDE) are recorded in self.stages, a ccmp_tools.instrument.Stages whose
+            report() gives a table; each record is also logged at DEBUG level to 'ccmp_tools.instrument'.
+            The default is False.
 
         Returns
         -------
@@ -89,44 +328,248 @@ class SiestaSimulation(Simulation):
                 
             If the file is not found or specified as False, we set self.fdfp and self.fdf as None.
 
+            Nothing is read at construction: self.fdfp, self.fdf, self.fdfmeta and the attributes taken from
+            the FDF (simlabel, latticeconstant, latticevectors, dt, istep, fstep, nsteps, simtype, mdtype, natoms,
+            nspecies, temperature, chemspeclab) are resolved on first access and cached. With the built-in
+            reader, sisl is only imported if self.fdf is used.
         '''
         #base directory of simulation
         self.path = path
+        #fdf is looked up and read in on first use
+        self._fdfb = fdfb
+        self._fdfext = fdfext
+        assert fdfreader in ('builtin', 'sisl'), "fdfreader has to be 'builtin' or 'sisl', not {}".format(fdfreader)
+        self._fdfreader = fdfreader
+        self.stages = instrumenttools.Stages() if instrument else None
 
+    @property
+    def frames(self):
+        '''Range of the .ANI frame indices held by self.universe, or None before a trajectory is loaded.
+        For an XYZ-reader Universe loaded without a frame index it is counted on first use, which scans the file.'''
+        frames = self.__dict__.get('_frames')
+        if frames is None and self.__dict__.get('universe') is not None:
+            frames = self._frames = range(self.universe.trajectory.n_frames)
+        return frames
+
+    @frames.setter
+    def frames(self, frames):
+        self._frames = frames
+
+    @cached_property
+    def fdfp(self):
+        '''Path of the FDF file, found with _filefind on first access.'''
         #fdf can be read in automatically if found; default is specified
-        self._filefind(attrp=fdfb, fext=fdfext, attr='fdfp')
-        #set sisl fdf reader
-        self.fdf = sisl.get_sile(self.fdfp) if self.fdfp else None
-        #if fdf found, can specify numerous things about the simulation
-        if self.fdf:
-            # TODO: expand data read in, add functionality for user input keys to .get()
-            self.simlabel = self.fdf.get("SimulationLabel")
-            self.latticeconstant = self.fdf.get('LatticeConstant')
-            self.latticevectors = np.array([float(v) for i in self.fdf.get("LatticeVectors") for v in i.split()]).reshape(3,3)
-            self.dt = self.fdf.get('MD.LengthTimeStep')
-            self.istep = self.fdf.get("MD.InitialTimeStep")
-            self.fstep = self.fdf.get("MD.FinalTimeStep")
-            #if both are specified, find number of steps
-            if self.istep and self.fstep:
-                self.nsteps = self.fdf.get("MD.FinalTimeStep") - self.fdf.get("MD.InitialTimeStep") + 1 #inclusive of first step
-            #if only final is specified
-            elif self.fstep and not self.istep:
-                self.nsteps = self.fstep
-            #if number of steps, assume MD simulation as opposed to GO or other
-            if self.nsteps:
-                self.simtype= 'md'
-            self.mdtype = self.fdf.get("MD.TypeOfRun")
-            #if mdtype is FC, this is a phonon calculation
-            if self.mdtype.lower() == 'FC'.lower():
-                self.simtype = 'phonon'
-            #if mdtype is CG, Broyden, or FIRE then it's GO
-            if self.mdtype.lower() in ['cg', 'broyden', 'fire']:
-                self.simtype = 'go'
-            self.natoms = self.fdf.get("NumberOfAtoms")
-            self.nspecies = self.fdf.get("NumberOfSpecies")
-            self.chemspeclab = [i.split() for i in self.fdf.get("ChemicalSpeciesLabel")]
-        
-    def iMD(self, ani=None, fext='.ANI', defaultcell=True):
+        with self._stage('fdf.find'):
+            self._filefind(attrp=self._fdfb, fext=self._fdfext, attr='fdfp')
+        return self.__dict__['fdfp']
+
+    @cached_property
+    def fdf(self):
+        '''sisl SILE object of self.fdfp, or None without an FDF.'''
+        if not self.fdfp:
+            return None
+        #sisl is only imported when there is an fdf to read
+        with self._stage('fdf.sisl', path=self.fdfp):
+            import sisl
+            return sisl.get_sile(self.fdfp)
+
+    @cached_property
+    def fdfmeta(self):
+        '''ccmp_tools.fdf.FDFReader of self.fdfp, or None without an FDF.'''
+        if not self.fdfp:
+            return None
+        with self._stage('fdf.read', path=self.fdfp):
+            return fdftools.FDFReader(self.fdfp)
+
+    def _fdfget(self, key, unit=None):
+        '''
+        Parameters
+        ----------
+        key : str
+            FDF key or block name.
+        unit : str, optional
+            Unit to convert a physical value to. The default is None, sisl's default unit.
+
+        Returns
+        -------
+        value
+            self.fdfmeta.get(key) (or self.fdf.get(key) with fdfreader='sisl', or if the built-in reader
+            fails), or None without an FDF. Values are memoized per reader in the process-wide
+            ccmp_tools.fdf.CACHE until the FDF or a file it includes changes, so other objects for the
+            same run (or a persisted cache) skip reading the FDF altogether.
+        '''
+        if not self.fdfp:
+            return None
+        def read():
+            if self._fdfreader == 'builtin':
+                try:
+                    return self.fdfmeta.get(key, unit=unit)
+                except (OSError, ValueError):
+                    #e.g. a unit the built-in reader does not know
+                    pass
+            return self.fdf.get(key, unit=unit) if unit else self.fdf.get(key)
+        return fdftools.CACHE.get(self.fdfp, key, unit, read, self._fdfreader)
+
+    # TODO: expand data read in, add functionality for user input keys to .get()
+    simlabel = _fdfkey("SimulationLabel")
+    latticeconstant = _fdfkey('LatticeConstant')
+    dt = _fdfkey('MD.LengthTimeStep')
+    istep = _fdfkey("MD.InitialTimeStep")
+    fstep = _fdfkey("MD.FinalTimeStep")
+    mdtype = _fdfkey("MD.TypeOfRun")
+    natoms = _fdfkey("NumberOfAtoms")
+    nspecies = _fdfkey("NumberOfSpecies")
+    #sisl would otherwise convert temperatures to eV
+    temperature = _fdfkey("MD.TargetTemperature", unit='K')
+
+    @cached_property
+    def latticevectors(self):
+        '''(3, 3) array of the LatticeVectors block, or None.'''
+        block = self._fdfget("LatticeVectors")
+        if not block:
+            return None
+        return np.array([float(v) for i in block for v in i.split()]).reshape(3,3)
+
+    @cached_property
+    def nsteps(self):
+        '''Number of MD steps from MD.InitialTimeStep and MD.FinalTimeStep, or None.'''
+        #if both are specified, find number of steps
+        if self.istep and self.fstep:
+            return self.fstep - self.istep + 1 #inclusive of first step
+        #if only final is specified
+        elif self.fstep and not self.istep:
+            return self.fstep
+        return None
+
+    @cached_property
+    def simtype(self):
+        ''''md', 'phonon' or 'go' depending on the FDF, or None.'''
+        mdtype = self.mdtype.lower() if self.mdtype else ''
+        #if mdtype is FC, this is a phonon calculation
+        if mdtype == 'fc':
+            return 'phonon'
+        #if mdtype is CG, Broyden, or FIRE then it's GO
+        if mdtype in ['cg', 'broyden', 'fire']:
+            return 'go'
+        #if number of steps, assume MD simulation as opposed to GO or other
+        if self.nsteps:
+            return 'md'
+        return None
+
+    @cached_property
+    def chemspeclab(self):
+        '''Split lines of the ChemicalSpeciesLabel block, or None.'''
+        block = self._fdfget("ChemicalSpeciesLabel")
+        return [i.split() for i in block] if block else None
+
+    def _defaultcell(self, stride=1, samples=None, chunk=256):
+        '''
+        Parameters
+        ----------
+        stride : int, optional
+            Only every stride-th frame is used for the estimate. The default is 1.
+        samples : int, optional
+            Maximum number of frames used for the estimate. If the trajectory holds more than samples*stride frames,
+            the stride is increased so that at most samples frames spread over the whole trajectory are read.
+            The default is None, no limit.
+        chunk : int, optional
+            Number of frames reduced at once. The default is 256.
+
+        Returns
+        -------
+        extents : np.ndarray
+            Array of shape (2, 3) holding the per-axis minimum and maximum coordinate over the sampled frames.
+        '''
+        nframes = self.universe.trajectory.n_frames
+        stride = max(int(stride), 1)
+        if samples:
+            stride = max(stride, -(-nframes // int(samples)))
+        mins = np.full(3, np.inf, dtype=np.float32)
+        maxs = np.full(3, -np.inf, dtype=np.float32)
+        for block in _frameblocks(self.universe.trajectory, chunk=chunk, step=stride):
+            np.minimum(mins, block.min(axis=(0, 1)), out=mins)
+            np.maximum(maxs, block.max(axis=(0, 1)), out=maxs)
+        return np.array([mins, maxs])
+
+    def _loaduniverse(self, dt, cache=False, nprocs=1, offsets=None, native=False, select=None, mapped=None):
+        '''
+        Parameters
+        ----------
+        dt : float
+            Time between frames passed to the Universe.
+        cache : bool or str, optional
+            If False, the .ANI file is read with the MDAnalysis XYZ reader.
+            Otherwise the positions are served from a float32 .npy cache keyed on the size and modification time
+            of self.anip, kept next to it (cache=True) or in the directory cache. A missing cache is written
+            from one pass of the XYZ reader. The default is False.
+        nprocs : int, optional
+            If larger than 1, the .ANI file is split on frame boundaries (self.offsets, or a fresh scan) and parsed
+            by nprocs processes into a shared float32 array, which backs an in-memory trajectory.
+            With cache, that array is the cache file. The default is 1.
+        offsets : np.ndarray, optional
+            Frame offsets of self.anip used to split it for nprocs > 1. The default is None, scanned when needed.
+        native : bool, optional
+            If True, the positions are parsed with ccmp_tools.ani.readani instead of the XYZ reader and
+            the Universe gets an in-memory trajectory. The default is False.
+        select : tuple, optional
+            (start, stop, step) frame selection. Only the selected frames are parsed (natively, or in parallel
+            for nprocs > 1) or, from an existing cache, paged in; a selection never writes a cache.
+            The time between frames of the Universe is dt*step. The default is None, all frames.
+        mapped : tuple, optional
+            (frames, positions) of _mappositions for the same selection, used instead of reading the .ANI file.
+            The default is None.
+
+        Returns
+        -------
+        universe : MDAnalysis.Universe
+            XYZ-reader Universe, or a Universe with an in-memory trajectory backed by the memory-mapped cache.
+            self.frames is set to the range of .ANI frame indices it holds. For the XYZ reader without offsets
+            it is only counted when first used (see frames), as that takes a pass over the whole file.
+        '''
+        #MDAnalysis is heavy to import, so it is only loaded once a Universe is needed
+        import MDAnalysis as MD
+        from MDAnalysis.coordinates.memory import MemoryReader
+        step = select[2] if select and select[2] else 1
+        dt = dt*step if dt else dt
+        if not cache and nprocs <= 1 and not native and not select:
+            universe = MD.Universe(self.anip, topology_format='xyz', format='xyz', dt=dt)
+            #with an index the reader is primed before anything asks for n_frames, which would scan the file
+            if offsets is not None:
+                _primexyz(universe.trajectory, offsets)
+                self.frames = range(len(offsets) - 1)
+            else:
+                self.frames = None
+            return universe
+        cachedir = None if cache is True else cache
+        positions = anitools.readcache(self.anip, cachedir) if cache and mapped is None else None
+        if mapped is not None:
+            self.frames, positions = mapped
+        elif positions is not None:
+            self.frames = anitools.selectframes(len(positions), *(select or ()))
+            positions = positions[slice(*select)] if select else positions
+        else:
+            offsets = offsets if offsets is not None else anitools.scanoffsets(self.anip)
+            self.frames = anitools.selectframes(len(offsets) - 1, *(select or ()))
+            frames = self.frames if select else None
+        if positions is None and nprocs > 1:
+            dest = anitools.cachepath(self.anip, cachedir) if cache and not select else None
+            positions = anitools.readparallel(self.anip, offsets, nprocs, dest, frames=frames)
+            if dest:
+                anitools._prune(self.anip, '.npy', dest, cachedir)
+        elif positions is None and (native or select):
+            positions = anitools.readani(self.anip, offsets, frames=frames)[1]
+            if cache and not select:
+                anitools.writecache(self.anip, [positions], positions.shape, cachedir)
+        elif positions is None:
+            traj = MD.Universe(self.anip, topology_format='xyz', format='xyz').trajectory
+            anitools.writecache(self.anip, _frameblocks(traj), (traj.n_frames, traj.n_atoms, 3), cachedir)
+            traj.close()
+            positions = anitools.readcache(self.anip, cachedir)
+        return MD.Universe(self.anip, positions, topology_format='xyz', format=MemoryReader, dt=dt)
+
+    def iMD(self, ani=None, fext='.ANI', defaultcell=True, cellstride=1, cellsamples=None, cellchunk=256,
+            cache=False, index=False, nprocs=1, native=False, start=None, stop=None, step=None,
+            tstart=None, tstop=None, tstep=None, tunit='fs', budget=None):
         '''
         Parameters
         ----------
@@ -140,6 +583,44 @@ class SiestaSimulation(Simulation):
             If True, an estimation of the simulation cell size is made.
             The estimation is made by making a cubic cell 10% larger than the largest displacement along the trajectory.
             The default is True.
+        cellstride : int, optional
+            Only every cellstride-th frame is used for the default cell estimation. The default is 1.
+        cellsamples : int, optional
+            Maximum number of frames used for the default cell estimation; the stride is increased
+            to respect it. The default is None, all (strided) frames.
+        cellchunk : int, optional
+            Number of frames per block in the vectorized default cell reduction. The default is 256.
+        cache : bool or str, optional
+            If True, positions are cached as a float32 .npy file next to the .ANI file on first load and
+            memory-mapped from it on later loads. A string is taken as the directory to keep the cache in.
+            The cache is keyed on size and modification time of the .ANI file. The default is False.
+        index : bool or str, optional
+            If True, a byte-offset index of the frames is loaded, or built and persisted next to the .ANI file
+            (in the directory index, if a string). It sets self.offsets and self.nframes without parsing
+            the trajectory, and lets the XYZ reader and self.frame() seek straight to any frame.
+            The default is False.
+        nprocs : int, optional
+            Number of processes used to parse the .ANI file. If larger than 1, the frames are parsed in parallel
+            into a shared float32 array and the Universe gets an in-memory trajectory. The default is 1.
+        native : bool, optional
+            If True, the .ANI file is parsed with the block-wise NumPy reader in ccmp_tools.ani rather than the
+            MDAnalysis XYZ reader, and the Universe gets an in-memory trajectory. The default is False.
+        start, stop, step : int, optional
+            Frame selection with slice semantics (negative start/stop count from the end, step > 0).
+            Only the selected frames are parsed and kept; the Universe then gets an in-memory trajectory
+            whose time between frames is step*dt. The default is None, all frames.
+        tstart, tstop, tstep : float, optional
+            The same selection in simulation time, converted to frames with self.dt (0.5 fs without FDF)
+            and rounded to the nearest frame, e.g. tstart=-5, tunit='ps' keeps the last 5 ps.
+            They take precedence over start, stop and step. The default is None.
+        tunit : str, optional
+            Unit of tstart, tstop and tstep, 'fs' or 'ps'. The default is 'fs'.
+        budget : int, optional
+            Memory budget in bytes. If native, nprocs > 1 or a selection would load more positions into memory
+            than this (see preflightMD), only the selected frames are converted to a binary file and memory-mapped
+            instead (see mapMD), and a warning is logged. That file is the cache if cache is set and there is
+            no selection, otherwise a temporary file that is removed once mapped. The default is None,
+            ccmp_tools.md.BUDGET.
 
         Returns
         -------
@@ -160,22 +641,56 @@ class SiestaSimulation(Simulation):
                     natoms, nsteps, and nspecies dependent on the input .ANI
                     The default cell dependent on maximum displacement between coordinates in trajectory.
                         *This is likely to GREATLY overestimate cell size when coordinates are not wrapped.*
+                    The per-axis (min, max) coordinates are kept in self.extents and the time the
+                    estimation took, in seconds, in self.celltime.
+            self.frames holds the range of .ANI frame indices loaded into the Universe, and self.preflight the
+            estimate of its size made before loading it.
+            With instrument=True, the stages iMD.find, iMD.index, iMD.fdf, iMD.preflight, iMD.map (over budget),
+            iMD.universe and iMD.defaultcell are recorded in self.stages.
         '''
         #first look for ani file
-        self._filefind(ani, fext, 'anip')
+        with self._stage('iMD.find'):
+            self._filefind(ani, fext, 'anip')
         #make sure there is one
         assert self.anip, "{} file not found in simulation directory.".format(fext)
-        if (self.fdf) and (self.latticeconstant) and (self.latticevectors.tolist()):
-            self.universe = MD.Universe(self.anip, topology_format='xyz',
-                                        format='xyz', dt=self.dt)
+        offsets = None
+        if index:
+            with self._stage('iMD.index', path=self.anip):
+                self.offsets = offsets = anitools.frameindex(self.anip, None if index is True else index)
+            self.nframes = len(self.offsets) - 1
+        with self._stage('iMD.fdf'):
+            #the cell is taken from the FDF if it has one, else the defaults of the module are used
+            if self.fdfp and self.latticeconstant and self.latticevectors is not None:
+                fdfcell = len(self.latticevectors) > 0
+            else:
+                fdfcell = False
+        #frame selection, given in time or in frames
+        if (tstart, tstop, tstep) != (None, None, None):
+            assert tunit in ('fs', 'ps'), "tunit has to be 'fs' or 'ps', got {}".format(tunit)
+            dt = (self.dt if fdfcell else 0.5)/(1000. if tunit == 'ps' else 1.)
+            start, stop, step = [None if t is None else int(round(t/dt)) for t in (tstart, tstop, tstep)]
+            step = max(step, 1) if step is not None else None
+        select = (start, stop, step) if (start, stop, step) != (None, None, None) else None
+        with self._stage('iMD.preflight', path=self.anip):
+            self.preflightMD(True, fext, start, stop, step, budget)
+        #the XYZ reader streams frames from disk, the other readers hold the positions in memory
+        mapped = None
+        if (native or nprocs > 1 or select) and not self.preflight['fits']:
+            log.warning("%.1f MB of positions exceed the memory budget of %.1f MB, memory-mapping them instead",
+                        self.preflight['selected_bytes']/1e6, self.preflight['budget']/1e6)
+            with self._stage('iMD.map', path=self.anip):
+                mapped = self._mappositions(cache, nprocs, offsets, select=select, mode='c')
+        if fdfcell:
+            with self._stage('iMD.universe', path=self.anip):
+                self.universe = self._loaduniverse(self.dt, cache, nprocs, offsets, native, select, mapped)
             #update topology with information from fdf
             #triclinic_dimensions attribute to allow cell specification for generic cell
             self.universe.triclinic_dimensions = self.latticeconstant*self.latticevectors
             #default to femtoseconds in siesta
             self.universe.trajectory.units['time'] = 'fs'
         else:
-            self.universe = MD.Universe(self.anip, topology_format='xyz',
-                                        format='xyz', dt=0.5)
+            with self._stage('iMD.universe', path=self.anip):
+                self.universe = self._loaduniverse(0.5, cache, nprocs, offsets, native, select, mapped)
             #populate default assumptions
             self.simtype = "md"
             self.mdtype = "verlet"
@@ -183,19 +698,366 @@ class SiestaSimulation(Simulation):
             self.nsteps = self.universe.trajectory.n_frames
             self.nspecies = len(set(self.universe.atoms.types))
             if defaultcell:
-                mins = []
-                maxs = []
                 #this will GREATLY overestimate size if a periodic calculation's coordinate output 
                 #is not wrapped
-                print("Calculating default cell...")
-                for frame in tqdm(self.universe.trajectory, file=sys.stdout):
-                    xyz = frame.positions
-                    maxs.append(xyz.max())
-                    mins.append(xyz.min())
-                cell_size = max(maxs) - min(mins)
+                log.info("Calculating default cell...")
+                t0 = time.perf_counter()
+                with self._stage('iMD.defaultcell'):
+                    self.extents = self._defaultcell(stride=cellstride, samples=cellsamples, chunk=cellchunk)
+                self.celltime = time.perf_counter() - t0
+                log.info("Default cell estimated in %.3f s", self.celltime)
+                cell_size = self.extents[1].max() - self.extents[0].min()
                 #set size to 10% greater than max-min of coordinates, cubic
                 self.universe.dimensions = 3*[cell_size*1.1] + 3*[90]
                     
+    def frame(self, n):
+        '''
+        Parameters
+        ----------
+        n : int
+            Index of the frame; negative values count from the end.
+
+        Returns
+        -------
+        positions : np.ndarray
+            float32 array of shape (natoms, 3) read directly from byte offset self.offsets[n] of self.anip.
+            Requires a previous call to self.iMD(..., index=True).
+        '''
+        assert getattr(self, 'offsets', None) is not None, "No frame index, call iMD(..., index=True) first."
+        return anitools.readframe(self.anip, self.offsets, n)[1]
+
+    def preflightMD(self, ani=True, fext='.ANI', start=None, stop=None, step=None, budget=None):
+        '''
+        Parameters
+        ----------
+        ani : arbitrary, optional
+            Either a string with SimulationLabel.ANI or a value to be checked by bool(), as in iMD.
+            With True, the .ANI file already set is reused. The default is True.
+        fext : str, optional
+            The extension for your ANI file, if not standard. The default is '.ANI'.
+        start, stop, step : int, optional
+            Frame selection to be loaded, as in iMD. The default is None, all frames.
+        budget : int, optional
+            Memory budget in bytes. The default is None, ccmp_tools.md.BUDGET, or half the physical memory
+            available now if that is None too.
+
+        Returns
+        -------
+        preflight : dict
+            Estimate of ccmp_tools.ani.estimate ('frames', 'atoms', 'filesize', 'bytes', 'exact'), made from
+            the frame index self.offsets if iMD(..., index=True) built it, otherwise from the first frame and
+            the file size only, plus 'selected' frames, their 'selected_bytes' in memory, the 'budget' and
+            whether they fit in it, 'fits'. Nothing else of the .ANI file is read. Also sets self.preflight.
+        '''
+        if not (ani is True and self.__dict__.get('anip')):
+            self._filefind(ani, fext, 'anip')
+        assert self.anip, "{} file not found in simulation directory.".format(fext)
+        preflight = anitools.estimate(self.anip, getattr(self, 'offsets', None))
+        selected = len(anitools.selectframes(preflight['frames'], start, stop, step))
+        if budget is None:
+            budget = BUDGET
+        if budget is None:
+            available = instrumenttools.availablememory()
+            budget = available // 2 if available is not None else float('inf')
+        preflight.update(selected=selected, selected_bytes=selected*preflight['atoms']*3*4, budget=budget)
+        preflight['fits'] = preflight['selected_bytes'] <= budget
+        self.preflight = preflight
+        return preflight
+
+    def mapMD(self, ani=True, fext='.ANI', cache=True, nprocs=1, blocksize=1 << 26, start=None, stop=None,
+              step=None):
+        '''
+        Parameters
+        ----------
+        ani : arbitrary, optional
+            Either a string with SimulationLabel.ANI or a value to be checked by bool(), as in iMD.
+            With True, the .ANI file already set by iMD or followMD is reused. The default is True.
+        fext : str, optional
+            The extension for your ANI file, if not standard. The default is '.ANI'.
+        cache : bool or str, optional
+            True keeps the binary float32 .npy file next to the .ANI file, a string is taken as the directory
+            to keep it in (see iMD). It is the same file as the position cache of iMD. If False, the positions
+            are converted to a temporary file instead, which is removed as soon as it is mapped.
+            The default is True.
+        nprocs : int, optional
+            Number of processes converting the .ANI file if there is no binary file yet. The default is 1.
+        blocksize : int, optional
+            Approximate number of bytes of the .ANI file converted at once with nprocs=1. The default is 64 MiB.
+        start, stop, step : int, optional
+            Frame selection, as in iMD. Only the selected frames are converted, to a temporary file (a selection
+            never writes the cache), or paged in from an existing cache. The default is None, all frames.
+
+        Returns
+        -------
+        positions : np.memmap
+            Read-only float32 array of shape (nframes, natoms, 3) mapped from the binary file, which is written
+            from the .ANI file in blocks first if it is missing or stale. Pages are only read when touched,
+            so vectorized NumPy code can run over the whole trajectory without loading it into memory.
+            Also sets self.positions if all frames are selected.
+        '''
+        if not (ani is True and self.__dict__.get('anip')):
+            self._filefind(ani, fext, 'anip')
+        assert self.anip, "{} file not found in simulation directory.".format(fext)
+        select = (start, stop, step) if (start, stop, step) != (None, None, None) else None
+        frames, positions = self._mappositions(cache, nprocs, getattr(self, 'offsets', None), blocksize, select)
+        if not select:
+            self.positions = positions
+        return positions
+
+    def _mappositions(self, cache=True, nprocs=1, offsets=None, blocksize=1 << 26, select=None, mode='r'):
+        '''
+        Parameters
+        ----------
+        cache, nprocs, blocksize : optional
+            As in mapMD.
+        offsets : np.ndarray, optional
+            Frame offsets of self.anip. The default is None, scanned when needed.
+        select : tuple, optional
+            (start, stop, step) frame selection. The default is None, all frames.
+        mode : str, optional
+            Memory map mode, 'r' (read-only) or 'c' (copy-on-write). The default is 'r'.
+
+        Returns
+        -------
+        frames : range
+            .ANI frame indices of the positions.
+        positions : np.memmap
+            Their float32 positions, see mapMD.
+        '''
+        cachedir = None if cache is True else cache
+        with self._stage('positions', path=self.anip):
+            positions = anitools.readcache(self.anip, cachedir, mode=mode) if cache else None
+            if positions is not None:
+                frames = anitools.selectframes(len(positions), *(select or ()))
+                return frames, positions[slice(*select)] if select else positions
+            natoms = anitools.readnatoms(self.anip)
+            offsets = offsets if offsets is not None else anitools.scanoffsets(self.anip, natoms)
+            frames = anitools.selectframes(len(offsets) - 1, *(select or ()))
+            dest = anitools.cachepath(self.anip, cachedir) if cache and not select else None
+            if nprocs > 1:
+                positions = anitools.readparallel(self.anip, offsets, nprocs, dest, frames=frames)
+                if dest:
+                    anitools._prune(self.anip, '.npy', dest, cachedir)
+                    positions = anitools.readcache(self.anip, cachedir, mode=mode)
+                elif mode == 'r':
+                    positions.flags.writeable = False
+            else:
+                blocks = (block for first, block in anitools.iterblocks(self.anip, offsets, blocksize, frames,
+                                                                        natoms))
+                if dest:
+                    anitools.writecache(self.anip, blocks, (len(frames), natoms, 3), cachedir)
+                    positions = anitools.readcache(self.anip, cachedir, mode=mode)
+                else:
+                    write = anitools._blockwriter(blocks, (len(frames), natoms, 3))
+                    positions = anitools._tempmap(self.anip, write, mode)
+        return frames, positions
+
+    @cached_property
+    def positions(self):
+        '''Read-only memory-mapped float32 (nframes, natoms, 3) positions of the .ANI file, see mapMD.'''
+        return self.mapMD()
+
+    def shareMD(self):
+        '''
+        Returns
+        -------
+        shared : ccmp_tools.shared.SharedTrajectory
+            Owning handle of a multiprocessing.shared_memory copy of the trajectory: the one of self.universe
+            if iMD or followMD loaded it, otherwise self.positions. Passed to worker processes it pickles to the
+            segment name only, and shared.array is there a zero-copy view, so any number of workers cost one
+            copy of the positions. Call shared.unlink() (or use it in a with statement) when the workers are
+            done. Also sets self.shared.
+        '''
+        from .shared import SharedTrajectory
+        with self._stage('shareMD'):
+            universe = self.__dict__.get('universe')
+            if universe is not None:
+                trajectory = universe.trajectory
+                #in-memory trajectories are copied in one go, others frame by frame
+                coordinates = getattr(trajectory, 'coordinate_array', None)
+                shape = (trajectory.n_frames, trajectory.n_atoms, 3)
+                blocks = coordinates if coordinates is not None else _frameblocks(trajectory)
+            else:
+                blocks = self.positions
+                shape = blocks.shape
+            self.shared = SharedTrajectory.publish(blocks, shape)
+        return self.shared
+
+    def iterMD(self, chunk=256, start=None, stop=None, step=None, ani=True, fext='.ANI'):
+        '''
+        Parameters
+        ----------
+        chunk : int, optional
+            Maximum number of frames per batch. The default is 256.
+        start, stop, step : int, optional
+            Frame selection with slice semantics, applied to the frames of self.universe if iMD or followMD
+            loaded it, otherwise to all frames of the .ANI file. The default is None, all frames.
+        ani : arbitrary, optional
+            Either a string with SimulationLabel.ANI or a value to be checked by bool(), as in iMD.
+            Only used without a Universe; with True, the .ANI file already set is reused. The default is True.
+        fext : str, optional
+            The extension for your ANI file, if not standard. The default is '.ANI'.
+
+        Yields
+        ------
+        steps : np.ndarray
+            int64 MD step of each frame of the batch, counted from MD.InitialTimeStep (1 without FDF).
+        times : np.ndarray
+            float64 simulation time of each frame in fs, frame index times self.dt (0.5 fs without FDF).
+        positions : np.ndarray
+            float32 array of shape (k, natoms, 3) with k <= chunk positions of consecutive selected frames.
+            They come from the in-memory trajectory of self.universe (as views), its reader, the memory map
+            self.positions if mapMD set it, or else are parsed from the .ANI file one batch at a time, so
+            analyses can be written as vectorized operations over batches rather than loops over frames.
+            Batches may be views or reused buffers; copy them if they have to outlive the iteration.
+        '''
+        assert chunk > 0, "chunk has to be positive, got {}".format(chunk)
+        universe = self.__dict__.get('universe')
+        positions = self.__dict__.get('positions')
+        if universe is not None:
+            frames = self.frames[start:stop:step]
+            blocks = _frameblocks(universe.trajectory, chunk, start, stop, step)
+        elif positions is not None:
+            frames = anitools.selectframes(len(positions), start, stop, step)
+            blocks = _rangeblocks(positions, frames, chunk)
+        else:
+            if not (ani is True and self.__dict__.get('anip')):
+                self._filefind(ani, fext, 'anip')
+            assert self.anip, "{} file not found in simulation directory.".format(fext)
+            natoms = anitools.readnatoms(self.anip)
+            offsets = getattr(self, 'offsets', None)
+            offsets = offsets if offsets is not None else anitools.scanoffsets(self.anip, natoms)
+            frames = anitools.selectframes(len(offsets) - 1, start, stop, step)
+            #blocksize of chunk and a half average frames, so that iterblocks yields chunk frames at a time
+            framebytes = (offsets[-1] - offsets[0]) / max(len(offsets) - 1, 1)
+            blocks = (block for first, block in anitools.iterblocks(self.anip, offsets, (chunk + .5)*framebytes,
+                                                                    frames, natoms))
+        istep = self.istep if self.fdfp and self.istep else 1
+        dt = self.dt if self.fdfp and self.dt else 0.5
+        n = 0
+        for block in blocks:
+            index = np.asarray(frames[n:n + len(block)], dtype=np.int64)
+            n += len(block)
+            yield istep + index, index*float(dt), block
+
+    def iMDhistory(self, md=True, fext='.MD', universe=True, start=None, stop=None, step=None):
+        '''
+        Parameters
+        ----------
+        md : arbitrary, optional
+            Either a string with SimulationLabel.MD or a value to be checked by bool(), as ani in iMD.
+            The default is True.
+        fext : str, optional
+            The extension for your binary MD history file, if not standard. The default is '.MD'.
+        universe : bool, optional
+            If True, self.universe is replaced by an MDAnalysis.Universe with an in-memory trajectory of the
+            positions, velocities and cells, named after the .ANI file's atoms if there is one.
+            The default is True.
+        start, stop, step : int, optional
+            Frame selection with slice semantics, as in iMD. The default is None, all steps.
+
+        Returns
+        -------
+        None. Updates object in-place:
+            self.mdp is the path of the unformatted .MD file SIESTA writes with WriteMDhistory (see
+            ccmp_tools.mdhistory), decoded without a loop over steps into
+            self.mdsteps, the MD step numbers,
+            self.mdpositions, float64 positions in Angstrom, shape (nframes, natoms, 3),
+            self.mdvelocities, float64 velocities in Angstrom/fs, shape (nframes, natoms, 3), and
+            self.mdcells, float64 lattice vectors (as rows) in Angstrom, shape (nframes, 3, 3), or None if
+            the cell is fixed; the Universe then gets the cell of the FDF, if any.
+            With universe, self.frames is the range of the selected steps, so iterMD and shareMD
+            serve these positions, and velocities are read from the trajectory rather than by finite
+            differences (MDAnalysis converts them to float32 like the positions).
+        '''
+        self._filefind(md, fext, 'mdp')
+        #names merely containing .md (e.g. the .MDE file) are not the binary history
+        if self.mdp and not isinstance(md, str) and os.path.splitext(self.mdp)[1].lower() != fext.lower():
+            self.mdp = None
+        assert self.mdp, "{} file not found in simulation directory.".format(fext)
+        with self._stage('iMDhistory.read', path=self.mdp):
+            dtype = mdhistorytools.layout(self.mdp)
+            frames = anitools.selectframes(os.path.getsize(self.mdp) // dtype.itemsize, start, stop, step)
+            self.mdsteps, self.mdpositions, self.mdvelocities, self.mdcells = mdhistorytools.readmd(
+                self.mdp, 'cell' in dtype.names, frames)
+        if not universe:
+            return
+        #MDAnalysis is heavy to import, so it is only loaded once a Universe is needed
+        import MDAnalysis as MD
+        from MDAnalysis.coordinates.memory import MemoryReader
+        from MDAnalysis.lib.mdamath import triclinic_box
+        with self._stage('iMDhistory.universe'):
+            nframes, natoms = self.mdpositions.shape[:2]
+            universe = MD.Universe.empty(natoms, trajectory=False)
+            anip = self.__dict__.get('anip')
+            if anip is None and self._dirindex().get('.ani'):
+                anip = os.path.join(self.path, self._dirindex()['.ani'][0])
+            if anip and anitools.readnatoms(anip) == natoms:
+                symbols = anitools.readsymbols(anip)
+                universe.add_TopologyAttr('names', symbols)
+                universe.add_TopologyAttr('types', symbols)
+            if self.mdcells is not None:
+                dimensions = np.array([triclinic_box(*cell) for cell in self.mdcells])
+            elif self.fdfp and self.latticeconstant and self.latticevectors is not None:
+                dimensions = triclinic_box(*(self.latticeconstant*self.latticevectors))
+            else:
+                dimensions = None
+            dt = (self.dt if self.fdfp and self.dt else 0.5)*(frames.step if len(frames) else 1)
+            universe.load_new(self.mdpositions, format=MemoryReader, velocities=self.mdvelocities,
+                              dimensions=dimensions, dt=dt)
+            #default to femtoseconds in siesta
+            universe.trajectory.units['time'] = 'fs'
+            self.universe = universe
+            self.frames = frames
+
+    def followMD(self, ani=True, fext='.ANI'):
+        '''
+        Parameters
+        ----------
+        ani : arbitrary, optional
+            Either a string with SimulationLabel.ANI or a value to be checked by bool(), as in iMD.
+            Only used on the first call. The default is True.
+        fext : str, optional
+            The extension for your ANI file, if not standard. The default is '.ANI'.
+
+        Returns
+        -------
+        nnew : int
+            Number of frames appended. Updates object in-place:
+                The first call reads all complete frames of the .ANI file, later calls only the complete frames
+                written since, starting at the byte offset self.anioffset reached before; a partially written
+                last frame is picked up once it is complete. If the file shrank (e.g. the run was restarted),
+                it is read again from the start.
+                self.universe is an MDAnalysis.Universe with an in-memory trajectory of all frames read so far,
+                and self.frames the range of their indices. The positions live in a buffer that grows by
+                doubling, so a refresh costs time proportional to the new frames only.
+        '''
+        #MDAnalysis is heavy to import, so it is only loaded once a Universe is needed
+        import MDAnalysis as MD
+        from MDAnalysis.coordinates.memory import MemoryReader
+        if getattr(self, 'anioffset', None) is None:
+            self._filefind(ani, fext, 'anip')
+            assert self.anip, "{} file not found in simulation directory.".format(fext)
+            self.anioffset, self._anibuf, self.universe, self.frames = 0, None, None, range(0)
+        if os.path.getsize(self.anip) < self.anioffset:
+            self.anioffset, self._anibuf, self.universe, self.frames = 0, None, None, range(0)
+        natoms = self._anibuf.shape[1] if self._anibuf is not None else None
+        positions, self.anioffset = anitools.follow(self.anip, self.anioffset, natoms)
+        if not len(positions):
+            return 0
+        used = len(self.frames)
+        self._anibuf = _extend(self._anibuf, used, positions)
+        self.frames = range(used + len(positions))
+        dt = self.dt if self.fdfp and self.dt else 0.5
+        if self.universe is None:
+            self.universe = MD.Universe(self.anip, self._anibuf[:len(self.frames)], topology_format='xyz',
+                                        format=MemoryReader, dt=dt)
+        else:
+            #the topology is kept, only the trajectory is swapped for a view of the grown buffer
+            self.universe.load_new(self._anibuf[:len(self.frames)], format=MemoryReader, dt=dt)
+        self.universe.trajectory.units['time'] = 'fs'
+        return len(positions)
+
     def iMDE(self, mde=None, fext='.MDE'):
         '''
         Parameters
@@ -216,11 +1078,128 @@ class SiestaSimulation(Simulation):
             If mde is is not a string, or is a string without matching mdeext(ension),
                 we look for a file in self.path with matching mdeext(ension) and set self.mdep as the matching file
                 and self.mde as the np.ndarray object with shape (nsteps, 6) with that path.
+            self.mdefields is a structured view of self.mde with fields step, T, E_KS, E_tot, Vol and P.
             If the file is not found or specified as False, we set self.mdep as None.
+            With instrument=True, the stages iMDE.find and iMDE.read are recorded in self.stages.
         '''
         #first look for mde file
-        self._filefind(mde, fext, 'mdep')
+        with self._stage('iMDE.find'):
+            self._filefind(mde, fext, 'mdep')
         #make sure there is one
         assert self.mdep, '{} file not found in simulation directory.'.format(fext)
-        self.mde = np.loadtxt(os.path.join(self.path, self.mdep),
-                              comments='#')
\ No newline at end of file
+        with self._stage('iMDE.read', path=self.mdep):
+            self.mde = mdetools.readmde(os.path.join(self.path, self.mdep))
+        #named, zero-copy access to the same data, e.g. self.mdefields['E_tot']
+        self.mdefields = mdetools.fieldview(self.mde)
+
+    def streamMDE(self, mde=True, fext='.MDE', rows=65536):
+        '''
+        Parameters
+        ----------
+        mde : arbitrary, optional
+            Either a string with SimulationLabel.MDE or a value to be checked by bool(), as in iMDE.
+            The default is True.
+        fext : str, optional
+            The file extension for the MDE file, if not standard. The default is '.MDE'.
+        rows : int, optional
+            Number of rows per block. The default is 65536.
+
+        Returns
+        -------
+        blocks : generator
+            Yields np.ndarray blocks of shape (k, 6), k <= rows, with the same columns as self.mde
+            (see ccmp_tools.mde.COLUMNS), so arbitrarily long files can be processed in bounded memory.
+            Sets self.mdep like iMDE, but not self.mde.
+        '''
+        self._filefind(mde, fext, 'mdep')
+        assert self.mdep, '{} file not found in simulation directory.'.format(fext)
+        return mdetools.iterblocks(self.mdep, rows)
+
+    def tailMDE(self, nrows, mde=True, fext='.MDE'):
+        '''
+        Parameters
+        ----------
+        nrows : int
+            Number of newest steps to read.
+        mde : arbitrary, optional
+            Either a string with SimulationLabel.MDE or a value to be checked by bool(), as in iMDE.
+            The default is True.
+        fext : str, optional
+            The file extension for the MDE file, if not standard. The default is '.MDE'.
+
+        Returns
+        -------
+        rows : np.ndarray
+            The last nrows rows of the MDE file, shape (nrows, 6), read backwards from the end of the file.
+            Sets self.mdep like iMDE, but not self.mde.
+        '''
+        self._filefind(mde, fext, 'mdep')
+        assert self.mdep, '{} file not found in simulation directory.'.format(fext)
+        return mdetools.tail(self.mdep, nrows)
+
+    def followMDE(self, mde=True, fext='.MDE'):
+        '''
+        Parameters
+        ----------
+        mde : arbitrary, optional
+            Either a string with SimulationLabel.MDE or a value to be checked by bool(), as in iMDE.
+            Only used on the first call. The default is True.
+        fext : str, optional
+            The file extension for the MDE file, if not standard. The default is '.MDE'.
+
+        Returns
+        -------
+        nnew : int
+            Number of rows appended. Updates object in-place:
+                The first call reads all complete rows of the .MDE file, later calls only the rows written since,
+                starting at the byte offset self.mdeoffset reached before; a partially written last line is
+                picked up once it is complete. If the file shrank (e.g. the run was restarted), it is read
+                again from the start.
+                self.mde and self.mdefields hold all rows read so far, as after iMDE. They are views of a buffer
+                that grows by doubling, so a refresh costs time proportional to the new rows only.
+        '''
+        if getattr(self, 'mdeoffset', None) is None:
+            self._filefind(mde, fext, 'mdep')
+            assert self.mdep, '{} file not found in simulation directory.'.format(fext)
+            self.mdeoffset, self._mdebuf = 0, None
+            self.mde = np.empty((0, len(mdetools.COLUMNS)))
+        if os.path.getsize(self.mdep) < self.mdeoffset:
+            self.mdeoffset, self._mdebuf = 0, None
+            self.mde = np.empty((0, len(mdetools.COLUMNS)))
+        rows, self.mdeoffset = mdetools.follow(self.mdep, self.mdeoffset)
+        if len(rows):
+            used = len(self.mde)
+            self._mdebuf = _extend(self._mdebuf, used, rows)
+            self.mde = self._mdebuf[:used + len(rows)]
+        self.mdefields = mdetools.fieldview(self.mde)
+        return len(rows)
+
+    def iOUT(self, out=True, fext='.out', quantities=outtools.QUANTITIES):
+        '''
+        Parameters
+        ----------
+        out : arbitrary, optional
+            Either a string with the name of the SIESTA output log or a value to be checked by bool(), as mde
+            in iMDE. The default is True.
+        fext : str, optional
+            The file extension for the output log, if not standard. The default is '.out'.
+        quantities : tuple of str, optional
+            Per-step quantities to extract, any of 'forces', 'stress', 'scf', 'dipole' and 'mulliken'.
+            Sections of the others are skipped. The default is all of them.
+
+        Returns
+        -------
+        None. Updates object in-place:
+            self.outp is the path of the output log, parsed in one streaming pass with constant memory
+            (see ccmp_tools.out.readout), and self.out a dict of per-step arrays: 'step' and the requested
+            quantities, e.g. self.out['forces'] of shape (nsteps, natoms, 3) in eV/Ang. The arrays are
+            preallocated for the number of steps and atoms of the FDF, if there is one.
+            With instrument=True, the stages iOUT.find and iOUT.read are recorded in self.stages.
+        '''
+        with self._stage('iOUT.find'):
+            self._filefind(out, fext, 'outp')
+        assert self.outp, '{} file not found in simulation directory.'.format(fext)
+        nsteps = self.nsteps if self.fdfp else None
+        natoms = self.natoms if self.fdfp else None
+        with self._stage('iOUT.read', path=self.outp):
+            self.out = outtools.readout(self.outp, quantities, nsteps=nsteps, natoms=natoms)
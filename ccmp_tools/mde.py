@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Utilities for SIESTA .MDE files (one whitespace separated row per MD step, '#' comments).
+"""
+import io, os
+import numpy as np
+
+#column order of the .MDE rows written by SIESTA
+COLUMNS = ('step', 'T', 'E_KS', 'E_tot', 'Vol', 'P')
+
+def _layout(first):
+    '''
+    Parameters
+    ----------
+    first : np.ndarray
+        uint8 bytes of the first data line, without the newline.
+
+    Returns
+    -------
+    fields : list of tuple
+        (start, end, dot) columns of each right-aligned field, dot being None for integer fields.
+    '''
+    space = first == ord(' ')
+    ends = np.flatnonzero(~space & np.append(space[1:], True)) + 1
+    fields = []
+    for a, b in zip(np.concatenate([[0], ends[:-1]]), ends):
+        dots = np.flatnonzero(first[a:b] == ord('.'))
+        if len(dots) > 1:
+            return None
+        fields.append((a, b, a + dots[0] if len(dots) else None))
+    return fields
+
+def fixedwidth(buf, chunk=4096):
+    '''
+    Parameters
+    ----------
+    buf : bytes-like
+        Data lines of an .MDE file (no comments), each ending in a newline.
+    chunk : int, optional
+        Number of rows converted at once. The default is 4096.
+
+    Returns
+    -------
+    rows : np.ndarray or None
+        float64 array of shape (nrows, ncols), or None if the lines are not the fixed-width Fortran
+        records SIESTA writes (equal line lengths, every field right-aligned with its decimal point in
+        the same column on every line, no exponents). The digits of each field are accumulated column by
+        column with integer arithmetic, so the result is identical to parsing the text with float().
+    '''
+    width = bytes(buf[:1 << 16]).find(b'\n') + 1
+    if not width or len(buf) % width:
+        return None
+    lines = np.frombuffer(buf, dtype=np.uint8).reshape(-1, width)
+    fields = _layout(lines[0, :-1])
+    if not fields or any(b - a > 19 for a, b, dot in fields):
+        return None
+    dotmask = np.zeros(width - 1, dtype=bool)
+    fieldstart = np.zeros(width - 1, dtype=bool)
+    for a, b, dot in fields:
+        fieldstart[a] = True
+        if dot is not None:
+            dotmask[dot] = True
+    rows = np.empty((len(lines), len(fields)))
+    zero = np.uint8(ord('0'))
+    for i in range(0, len(lines), chunk):
+        block = lines[i:i + chunk]
+        #bytes relative to '0' (wrapping), one contiguous row per text column so that the per-column
+        #work below runs over contiguous memory: digits are 0-9, ' ' is 240, '-' 253 and '.' 254
+        rel = np.ascontiguousarray((block[:, :-1] - zero).T)
+        digits = rel <= 9
+        space = rel == 240
+        #only known bytes, newlines at the end, decimal points where the first line has them,
+        #and within a field the padding has to come before the number
+        if not ((digits | space | (rel >= 253)).all() and (block[:, -1] == ord('\n')).all()
+                and ((rel == 254) == dotmask[:, None]).all()
+                and not (space[1:] & ~space[:-1] & ~fieldstart[1:, None]).any()):
+            return None
+        minus = rel == 253
+        #non-digits count as 0 (multiplying by the mask is much faster than np.where here)
+        np.multiply(rel, digits, out=rel)
+        value = np.empty(len(block), dtype=np.int64)
+        negative = np.empty(len(block), dtype=bool)
+        for j, (a, b, dot) in enumerate(fields):
+            value[:] = 0
+            negative[:] = False
+            for c in range(a, b):
+                if c != dot:
+                    value *= 10
+                    value += rel[c]
+                    negative |= minus[c]
+            np.negative(value, out=value, where=negative)
+            np.divide(value, 10.0**(b - dot - 1 if dot is not None else 0), out=rows[i:i + chunk, j])
+    return rows
+
+def _stripcomments(buf):
+    '''Remove '#' comments from buf; lines holding only a comment are dropped entirely.'''
+    parts = []
+    pos = 0
+    while True:
+        h = buf.find(b'#', pos)
+        if h < 0:
+            break
+        start = buf.rfind(b'\n', 0, h) + 1
+        end = buf.find(b'\n', h)
+        end = len(buf) if end < 0 else end
+        if buf[start:h].strip():
+            #keep data in front of a trailing comment, and its newline
+            parts.append(buf[pos:h])
+            pos = end
+        else:
+            parts.append(buf[pos:start])
+            pos = end + 1
+    parts.append(buf[pos:])
+    return b''.join(parts)
+
+def readmde(mdep):
+    '''
+    Parameters
+    ----------
+    mdep : str
+        Path to the .MDE file.
+
+    Returns
+    -------
+    rows : np.ndarray
+        float64 array of shape (nsteps, ncols), see COLUMNS, always two-dimensional, and (0, len(COLUMNS))
+        before the first complete data line. Uses the fixed-width parser when the file has the layout SIESTA
+        writes and falls back to np.loadtxt otherwise. A partially written last line is ignored.
+    '''
+    with open(mdep, 'rb') as f:
+        buf = f.read()
+    end = buf.rfind(b'\n') + 1
+    #skip the header without copying; comments further down (e.g. from restarts) need a stripped copy
+    start = 0
+    while buf.startswith(b'#', start) or buf.startswith(b'\n', start):
+        start = buf.find(b'\n', start) + 1 or end
+    body = memoryview(buf)[start:end]
+    if buf.find(b'#', start, end) >= 0:
+        body = _stripcomments(bytes(body))
+    #a run that has only written the header has the same columns as follow() and parselines() give
+    if not bytes(body[:4096]).strip() and not bytes(body).strip():
+        return np.empty((0, len(COLUMNS)))
+    rows = fixedwidth(body)
+    if rows is None:
+        rows = np.loadtxt(io.BytesIO(body), comments='#', ndmin=2)
+    return rows
+
+def fieldview(rows, names=COLUMNS):
+    '''
+    Parameters
+    ----------
+    rows : np.ndarray
+        C-contiguous float64 array of shape (nsteps, ncols), e.g. from readmde.
+    names : tuple, optional
+        Field names of the columns; missing names are filled with 'col<i>'. The default is COLUMNS.
+
+    Returns
+    -------
+    fields : np.ndarray
+        Structured view of shape (nsteps,) sharing memory with rows, so that fields['E_tot'] is rows[:, 3].
+    '''
+    names = tuple(names[:rows.shape[1]]) + tuple('col{}'.format(i) for i in range(len(names), rows.shape[1]))
+    return rows.view(np.dtype([(n, np.float64) for n in names])).reshape(len(rows))
+
+def parselines(buf):
+    '''
+    Parameters
+    ----------
+    buf : bytes
+        Complete lines of an .MDE file; comment and blank lines are skipped.
+
+    Returns
+    -------
+    rows : np.ndarray
+        float64 array of shape (nrows, ncols), with ncols taken from the first data line.
+    '''
+    lines = [line for line in buf.split(b'\n') if line.strip() and not line.lstrip().startswith(b'#')]
+    if not lines:
+        return np.empty((0, len(COLUMNS)))
+    return np.array(b' '.join(lines).split(), dtype=np.float64).reshape(len(lines), -1)
+
+def iterblocks(mdep, rows=65536, offset=0, blocksize=1 << 22):
+    '''
+    Parameters
+    ----------
+    mdep : str
+        Path to the .MDE file.
+    rows : int, optional
+        Number of rows per yielded block; only the last block may be shorter. The default is 65536.
+    offset : int, optional
+        Byte offset to start reading at; it has to be the start of a line. The default is 0.
+    blocksize : int, optional
+        Number of bytes read at once. The default is 4 MiB.
+
+    Yields
+    ------
+    block : np.ndarray
+        float64 array of shape (k, ncols) with k <= rows consecutive rows, see COLUMNS.
+        A partially written last line is not parsed, so memory use is bounded by rows and blocksize
+        regardless of the length of the file.
+    '''
+    pending = []
+    npending = 0
+    with open(mdep, 'rb') as f:
+        f.seek(offset)
+        rest = b''
+        while True:
+            buf = f.read(blocksize)
+            if not buf:
+                break
+            buf = rest + buf
+            cut = buf.rfind(b'\n') + 1
+            rest = buf[cut:]
+            data = parselines(buf[:cut])
+            if not len(data):
+                continue
+            pending.append(data)
+            npending += len(data)
+            if npending >= rows:
+                data = np.concatenate(pending)
+                full = len(data) - len(data) % rows
+                for i in range(0, full, rows):
+                    yield data[i:i + rows]
+                pending = [data[full:]]
+                npending = len(pending[0])
+    if npending:
+        yield np.concatenate(pending)
+
+def follow(mdep, offset=0):
+    '''
+    Parameters
+    ----------
+    mdep : str
+        Path to an .MDE file that may still be written.
+    offset : int, optional
+        Byte offset of a line start to continue from, e.g. the offset returned by the previous call.
+        The default is 0.
+
+    Returns
+    -------
+    rows : np.ndarray
+        float64 array of shape (k, ncols) of the complete rows written after offset, parsed like readmde.
+    offset : int
+        Byte offset just after the last complete line; a partially written line is left for the next call.
+    '''
+    with open(mdep, 'rb') as f:
+        f.seek(offset)
+        buf = f.read()
+    end = buf.rfind(b'\n') + 1
+    body = buf[:end]
+    if body.find(b'#') >= 0:
+        body = _stripcomments(body)
+    rows = fixedwidth(body) if body else None
+    if rows is None:
+        rows = parselines(body)
+    return rows, offset + end
+
+def tail(mdep, nrows, blocksize=1 << 16):
+    '''
+    Parameters
+    ----------
+    mdep : str
+        Path to the .MDE file.
+    nrows : int
+        Number of rows to return.
+    blocksize : int, optional
+        Number of bytes first read backwards from the end of the file, doubled until enough rows are found.
+        The default is 64 KiB.
+
+    Returns
+    -------
+    rows : np.ndarray
+        The last nrows complete rows (fewer if the file is shorter), read without touching the rest of the file.
+    '''
+    with open(mdep, 'rb') as f:
+        end = pos = f.seek(0, os.SEEK_END)
+        data = parselines(b'')
+        while pos > 0:
+            pos = max(pos - blocksize, 0)
+            f.seek(pos)
+            buf = f.read(end - pos)
+            #complete lines only: the first one may be cut by the seek, the last one may still be written
+            first = buf.find(b'\n') + 1 if pos > 0 else 0
+            data = parselines(buf[first:buf.rfind(b'\n') + 1])
+            if len(data) >= nrows:
+                break
+            blocksize *= 2
+    return data[len(data) - min(nrows, len(data)):]
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Utilities for SIESTA .MD files, the unformatted Fortran MD history written with WriteMDhistory.
+
+Every MD step appends the record (istep, xa(3,na), va(3,na)) and, for variable cell runs, the record
+(cell(3,3), vcell(3,3)), in Bohr, Bohr/fs and double precision, each framed by 4-byte record length markers.
+"""
+import os
+import numpy as np
+from . import fdf as fdftools
+
+#Bohr in Angstrom, with the constant of the FDF unit table
+BOHR = fdftools.convert(1., 'Bohr', 'Ang')
+
+def _dtype(natoms, varcel, byteorder='<'):
+    '''Structured dtype of the records of one MD step, see layout.'''
+    i4, f8 = byteorder + 'i4', byteorder + 'f8'
+    fields = [('head', i4), ('istep', i4), ('xa', f8, (natoms, 3)), ('va', f8, (natoms, 3)), ('tail', i4)]
+    if varcel:
+        fields += [('cellhead', i4), ('cell', f8, (3, 3)), ('vcell', f8, (3, 3)), ('celltail', i4)]
+    return np.dtype(fields)
+
+def _markers(f, byteorder):
+    '''First two record length markers of the open file f with byteorder '<' or '>', or None past its end.'''
+    f.seek(0)
+    first = np.frombuffer(f.read(4), dtype=byteorder + 'i4')
+    if not len(first) or first[0] <= 4 or (first[0] - 4) % 48:
+        return None, None
+    f.seek(4 + int(first[0]))
+    end = np.frombuffer(f.read(4), dtype=byteorder + 'i4')
+    if not len(end) or end[0] != first[0]:
+        return None, None
+    second = np.frombuffer(f.read(4), dtype=byteorder + 'i4')
+    return int(first[0]), int(second[0]) if len(second) else None
+
+def layout(mdp, varcel=None):
+    '''
+    Parameters
+    ----------
+    mdp : str
+        Path to the .MD file.
+    varcel : bool, optional
+        Whether the file holds cell records. The default is None, told from the record length that
+        follows the first step.
+
+    Returns
+    -------
+    dtype : np.dtype
+        Structured dtype of the records of one MD step, with fields 'istep', 'xa', 'va' (shape (natoms, 3))
+        and, with varcel, 'cell' and 'vcell' (shape (3, 3), lattice vectors as rows), plus the markers.
+        The byte order (little or big endian) is detected from the first marker.
+    '''
+    with open(mdp, 'rb') as f:
+        for byteorder in ('<', '>'):
+            reclen, nextlen = _markers(f, byteorder)
+            if reclen:
+                break
+    assert reclen, "{} is not an unformatted SIESTA .MD file with 4-byte record markers".format(mdp)
+    if varcel is None:
+        varcel = nextlen == 144
+    return _dtype((reclen - 4) // 48, varcel, byteorder)
+
+def readmd(mdp, varcel=None, frames=None):
+    '''
+    Parameters
+    ----------
+    mdp : str
+        Path to the .MD file.
+    varcel : bool, optional
+        Whether the file holds cell records, see layout. The default is None, detected.
+    frames : range, optional
+        Steps to read, see ccmp_tools.ani.selectframes. The default is None, all complete steps.
+
+    Returns
+    -------
+    steps : np.ndarray
+        int64 MD step numbers, shape (nframes,).
+    positions : np.ndarray
+        float64 positions in Angstrom, shape (nframes, natoms, 3).
+    velocities : np.ndarray
+        float64 velocities in Angstrom/fs, shape (nframes, natoms, 3).
+    cells : np.ndarray or None
+        float64 lattice vectors (as rows) in Angstrom, shape (nframes, 3, 3), or None for a fixed cell.
+        The records are decoded with one memory-mapped structured array, without a loop over steps;
+        an incomplete last step of a running simulation is left out.
+    '''
+    dtype = layout(mdp, varcel)
+    nframes = os.path.getsize(mdp) // dtype.itemsize
+    records = np.memmap(mdp, dtype=dtype, mode='r', shape=(nframes,)) if nframes else np.zeros(0, dtype)
+    if frames is not None:
+        records = records[frames.start:frames.stop:frames.step]
+    markers = [('head', 'tail', dtype['xa'].itemsize*2 + 4)]
+    if 'cell' in dtype.names:
+        markers.append(('cellhead', 'celltail', 144))
+    for head, tail, reclen in markers:
+        assert (records[head] == reclen).all() and (records[tail] == reclen).all(), \
+            "inconsistent records in {}, is varcel right?".format(mdp)
+    steps = records['istep'].astype(np.int64)
+    positions = records['xa']*BOHR
+    velocities = records['va']*BOHR
+    cells = records['cell']*BOHR if 'cell' in dtype.names else None
+    return steps, positions, velocities, cells
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Watching the .MDE files of many running SIESTA simulations from one asyncio event loop.
+"""
+import asyncio, os
+from concurrent.futures import ThreadPoolExecutor
+from . import mde as mdetools
+from .campaign import discover
+from .md import findfile
+
+class Monitor():
+    '''Polls the .MDE files of many runs and reports the newest T, E_tot drift and P of every run that advanced.'''
+    def __init__(self, runs, interval=5., concurrency=16, fext='.MDE', fdfext='.fdf'):
+        '''
+        Parameters
+        ----------
+        runs : str or list of str
+            Run directories, or a directory or glob pattern they are discovered in (see ccmp_tools.campaign.discover).
+        interval : float, optional
+            Seconds between two polls of all runs. The default is 5.
+        concurrency : int, optional
+            Maximum number of files checked or read at the same time, by a pool of that many threads
+            shared by all runs. The default is 16.
+        fext : str, optional
+            The file extension for the MDE file, if not standard. The default is '.MDE'.
+        fdfext : str, optional
+            Extension of the FDF file marking a run directory, if runs is searched. The default is '.fdf'.
+
+        Returns
+        -------
+        None. Nothing is read until the first poll; a run whose .MDE file does not exist yet is picked up
+        once it appears.
+        '''
+        paths = discover(runs, fdfext) if isinstance(runs, str) else list(runs)
+        self.interval = interval
+        self.concurrency = concurrency
+        self.fext = fext
+        #per-run state: .MDE path, parsed byte offset, size at the last poll and summary of the rows so far
+        self.state = {path: {'mdep': None, 'offset': 0, 'size': None, 'rows': 0, 'E_tot_first': None}
+                      for path in paths}
+        self.stopped = False
+
+    def __len__(self):
+        return len(self.state)
+
+    def _findmde(self, path):
+        '''The .MDE file of path as SiestaSimulation finds it (see ccmp_tools.md.findfile), or None.'''
+        return findfile(path, self.fext, 'mdep')
+
+    def _advance(self, path):
+        '''
+        Parameters
+        ----------
+        path : str
+            Run directory.
+
+        Returns
+        -------
+        update : dict or None
+            Summary of the run after parsing the rows written since the last call, or None if its .MDE file
+            did not change. Runs in a worker thread; the file is only stat'ed unless it grew.
+        '''
+        state = self.state[path]
+        if state['mdep'] is None:
+            state['mdep'] = self._findmde(path)
+            if state['mdep'] is None:
+                return None
+        try:
+            size = os.stat(state['mdep']).st_size
+        except FileNotFoundError:
+            return None
+        if size == state['size']:
+            return None
+        if size < state['offset']:
+            #the file was rewritten, e.g. by a restart from scratch
+            state.update(offset=0, rows=0, E_tot_first=None)
+        state['size'] = size
+        rows, state['offset'] = mdetools.follow(state['mdep'], state['offset'])
+        if not len(rows):
+            return None
+        fields = mdetools.fieldview(rows)
+        if state['E_tot_first'] is None:
+            state['E_tot_first'] = fields['E_tot'][0]
+        state['rows'] += len(rows)
+        last = fields[-1]
+        return {'path': path, 'rows': state['rows'], 'new': len(rows), 'step': int(last['step']), 'T': last['T'],
+                'E_tot': last['E_tot'], 'drift': last['E_tot'] - state['E_tot_first'], 'P': last['P']}
+
+    async def poll(self, executor=None):
+        '''
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor, optional
+            Executor the file checks run in. The default is None, a pool of self.concurrency threads
+            for this poll.
+
+        Returns
+        -------
+        updates : list of dict
+            One dict per run with new rows: 'path', 'rows' (parsed so far), 'new', and 'step', 'T', 'E_tot',
+            'drift' (E_tot minus that of the first row seen) and 'P' of the newest row.
+        '''
+        loop = asyncio.get_running_loop()
+        pool = executor if executor else ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            updates = await asyncio.gather(*(loop.run_in_executor(pool, self._advance, p) for p in self.state))
+        finally:
+            if not executor:
+                pool.shutdown(wait=False)
+        return [u for u in updates if u is not None]
+
+    async def __aiter__(self):
+        '''Yields the updates of every poll, then sleeps self.interval seconds, until stop() is called.'''
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self.stopped:
+                for update in await self.poll(pool):
+                    yield update
+                    if self.stopped:
+                        return
+                await asyncio.sleep(self.interval)
+
+    async def run(self, callback, polls=None):
+        '''
+        Parameters
+        ----------
+        callback : callable
+            Called with every update dict (see poll); a coroutine function is awaited.
+        polls : int, optional
+            Number of polls before returning. The default is None, until stop() is called.
+
+        Returns
+        -------
+        None.
+        '''
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            n = 0
+            while not self.stopped and (polls is None or n < polls):
+                for update in await self.poll(pool):
+                    result = callback(update)
+                    if asyncio.iscoroutine(result):
+                        await result
+                n += 1
+                if polls is None or n < polls:
+                    await asyncio.sleep(self.interval)
+
+    def stop(self):
+        '''Ends iteration and run() after the current poll.'''
+        self.stopped = True
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Utilities for the main SIESTA output log (.out): per-step quantities parsed in one streaming pass.
+"""
+import re
+import numpy as np
+
+#quantities readout can extract, per MD (or relaxation) step
+QUANTITIES = ('forces', 'stress', 'scf', 'dipole', 'mulliken')
+
+#headers of the step and of every quantity; only those of requested quantities are searched for. They start
+#with a literal, which the re module searches for quickly, unlike '^' anchors or an alternation of them
+_PATTERNS = {
+    'step': re.compile(rb'Begin [^=\n]*=[ \t]*(\d+)[ \t]*\n'),
+    'natoms': re.compile(rb'initatomlists: Number of atoms, orbitals, and projectors:[ \t]*(\d+)'),
+    'forces': re.compile(rb'siesta: Atomic forces \(eV/Ang\):[ \t]*\n'),
+    'stress': re.compile(rb'Stress-tensor-Voigt \(kbar\):([^\n]*)\n'),
+    'scf': re.compile(rb'scf:[ \t]+(\d+)[ \t]'),
+    'dipole': re.compile(rb'Electric dipole \(Debye\)[ \t]*=([^\n]*)\n'),
+    'mulliken': re.compile(rb'mulliken: Atomic and Orbital Populations:'),
+}
+#ends of the multi-line sections: the dashed line below the forces, the total charge below the populations
+_ENDS = {'forces': b'--------', 'mulliken': b'mulliken: Qtot'}
+
+def _headers(buf, end, names):
+    '''(start, name, match) of the headers of names in buf[:end], in the order they appear.'''
+    found = [(m.start(), name, m) for name in names for m in _PATTERNS[name].finditer(buf, 0, end)]
+    found.sort(key=lambda h: h[0])
+    return found
+
+def _charges(section):
+    '''Atom index -> total charge of the atom rows of a Mulliken section (orbital rows start with a float).'''
+    charges = {}
+    for line in section.split(b'\n'):
+        fields = line.split(None, 2)
+        if len(fields) > 1 and fields[0].isdigit() and b'.' in fields[1]:
+            charges[int(fields[0])] = float(fields[1])
+    return charges
+
+def _floats(buf):
+    '''float64 array of the whitespace separated numbers in bytes buf.'''
+    return np.array(buf.split(), dtype=np.float64)
+
+class _Steps():
+    '''Preallocated per-step arrays, grown by doubling when a run has more steps than expected.'''
+    def __init__(self, quantities, nsteps, natoms):
+        self.quantities = quantities
+        self.capacity = max(int(nsteps), 1)
+        self.natoms = natoms
+        self.n = 0
+        self.arrays = {'step': np.zeros(self.capacity, dtype=np.int64)}
+        if 'stress' in quantities:
+            self.arrays['stress'] = np.full((self.capacity, 6), np.nan)
+        if 'scf' in quantities:
+            self.arrays['scf'] = np.zeros(self.capacity, dtype=np.int64)
+        if 'dipole' in quantities:
+            self.arrays['dipole'] = np.full((self.capacity, 3), np.nan)
+        if natoms:
+            self._peratom(natoms)
+
+    def _peratom(self, natoms):
+        '''Allocate the per-atom arrays once the atom count is known.'''
+        self.natoms = natoms
+        if 'forces' in self.quantities and 'forces' not in self.arrays:
+            self.arrays['forces'] = np.full((self.capacity, natoms, 3), np.nan)
+        if 'mulliken' in self.quantities and 'mulliken' not in self.arrays:
+            self.arrays['mulliken'] = np.full((self.capacity, natoms), np.nan)
+
+    def begin(self, step):
+        '''Start the next step, numbered step.'''
+        if self.n == self.capacity:
+            self.capacity *= 2
+            for name, array in self.arrays.items():
+                grown = np.full((self.capacity,) + array.shape[1:], np.nan if array.dtype.kind == 'f' else 0,
+                                dtype=array.dtype)
+                grown[:self.n] = array[:self.n]
+                self.arrays[name] = grown
+        self.arrays['step'][self.n] = step
+        self.n += 1
+
+    def store(self, name, value):
+        '''Set quantity name of the current step, opening step 0 for output before the first step header.'''
+        if not self.n:
+            self.begin(0)
+        if name in ('forces', 'mulliken') and self.natoms is None:
+            self._peratom(len(value))
+        self.arrays[name][self.n - 1] = value
+
+    def result(self):
+        '''The arrays trimmed to the steps seen.'''
+        out = {name: array[:self.n] for name, array in self.arrays.items()}
+        out['natoms'] = self.natoms
+        return out
+
+def readout(outp, quantities=QUANTITIES, nsteps=None, natoms=None, blocksize=1 << 24):
+    '''
+    Parameters
+    ----------
+    outp : str
+        Path to the SIESTA output log.
+    quantities : tuple of str, optional
+        Quantities to extract, any of QUANTITIES. Sections of the others are not parsed. The default is all.
+    nsteps : int, optional
+        Expected number of steps, for which the arrays are preallocated; they double in size if there
+        are more. The default is None, 1024.
+    natoms : int, optional
+        Number of atoms. The default is None, read from the log (initatomlists) or the first forces block.
+    blocksize : int, optional
+        Number of bytes read at once. Memory use is independent of the size of the log. The default is 16 MiB.
+
+    Returns
+    -------
+    out : dict
+        'step': int64 step numbers (from the 'Begin ... step/move = n' headers; output before the first one
+        is step 0), 'natoms', and of the requested quantities, with one row per step and NaN (0 for scf)
+        where a step did not print them:
+        'forces': float64 (nsteps, natoms, 3) atomic forces in eV/Ang,
+        'stress': float64 (nsteps, 6) Stress-tensor-Voigt in kbar, in the order SIESTA prints it,
+        'scf': int64 (nsteps,) number of SCF iterations,
+        'dipole': float64 (nsteps, 3) electric dipole in Debye,
+        'mulliken': float64 (nsteps, natoms) Mulliken charge (Qatom) of each atom (non spin-polarized output).
+        The log is read in blocks, which are searched for the headers of the requested quantities only,
+        so everything else is skipped without being split into lines.
+    '''
+    unknown = set(quantities) - set(QUANTITIES)
+    assert not unknown, "unknown quantities {}, choose from {}".format(sorted(unknown), QUANTITIES)
+    names = ('step', 'natoms') + tuple(quantities)
+    steps = _Steps(quantities, nsteps if nsteps else 1024, natoms)
+    buf = b''
+    with open(outp, 'rb') as f:
+        while True:
+            data = f.read(blocksize)
+            buf += data
+            #only whole lines are searched; at the end of the file, everything is
+            end = buf.rfind(b'\n') + 1 if data else len(buf)
+            carry = end
+            pos = 0
+            for start, kind, m in _headers(buf, end, names):
+                if start < pos:
+                    continue
+                if kind == 'step':
+                    steps.begin(int(m.group(1)))
+                elif kind == 'natoms':
+                    if steps.natoms is None:
+                        steps._peratom(int(m.group(1)))
+                elif kind == 'scf':
+                    if not steps.n:
+                        steps.begin(0)
+                    scf = steps.arrays['scf']
+                    scf[steps.n - 1] = max(scf[steps.n - 1], int(m.group(1)))
+                elif kind == 'stress':
+                    steps.store('stress', _floats(m.group(1))[:6])
+                elif kind == 'dipole':
+                    steps.store('dipole', _floats(m.group(1))[:3])
+                else:
+                    close = buf.find(_ENDS[kind], m.end(), end)
+                    if close < 0:
+                        #the section continues in the next block, which is appended to it
+                        if data:
+                            carry = start
+                            break
+                        continue
+                    section = buf[m.end():close]
+                    if kind == 'forces':
+                        rows = _floats(section.replace(b'siesta:', b''))
+                        steps.store('forces', rows.reshape(-1, 4)[:, 1:])
+                    else:
+                        charges = _charges(section)
+                        if steps.natoms is None or len(charges) == steps.natoms:
+                            steps.store('mulliken', [charges[a] for a in sorted(charges)])
+                    pos = close + len(_ENDS[kind])
+            buf = buf[carry:]
+            if not data:
+                break
+    return steps.result()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trajectories in multiprocessing.shared_memory, so that worker processes share one copy of the positions.
+"""
+import sys
+from multiprocessing import shared_memory
+import numpy as np
+
+def _attach(name):
+    '''
+    Parameters
+    ----------
+    name : str
+        Name of an existing shared memory segment.
+
+    Returns
+    -------
+    shm : multiprocessing.shared_memory.SharedMemory
+        The segment, not tracked by this process. Before Python 3.13 attaching registers it with the resource
+        tracker, which unlinks it when the tracker exits. Processes started by multiprocessing share the
+        tracker of their parent, where the segment is registered already, so nothing changes for them. Any
+        other process starts a tracker of its own, which would unlink the segment while the owner still uses
+        it; only there the segment is unregistered again, as track=False does in 3.13.
+    '''
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    from multiprocessing import resource_tracker
+    inherited = resource_tracker._resource_tracker._fd is not None
+    shm = shared_memory.SharedMemory(name=name)
+    if not inherited:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+class SharedTrajectory():
+    '''float32 (nframes, natoms, 3) positions in shared memory; pickles to the segment name, attaches zero-copy.'''
+    def __init__(self, name, shape, dtype='float32', owner=False, shm=None):
+        '''
+        Parameters
+        ----------
+        name : str
+            Name of the shared memory segment.
+        shape : tuple
+            (nframes, natoms, 3).
+        dtype : str, optional
+            dtype of the positions. The default is 'float32'.
+        owner : bool, optional
+            True in the publishing process, which unlinks the segment on unlink() or when used as a context
+            manager. The default is False.
+        shm : SharedMemory, optional
+            Already open segment. The default is None, attached by name.
+
+        Returns
+        -------
+        None. self.array is a NumPy view of the segment (read-only unless owner), no data is copied.
+        '''
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = owner
+        self.shm = shm if shm is not None else _attach(name)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+        self.array.flags.writeable = owner
+
+    @classmethod
+    def publish(cls, blocks, shape, dtype='float32'):
+        '''
+        Parameters
+        ----------
+        blocks : np.ndarray or iterable of np.ndarray
+            The positions, or consecutive (k, natoms, 3) blocks of them (e.g. from a memory map or an
+            MDAnalysis trajectory), copied into the segment one at a time.
+        shape : tuple
+            (nframes, natoms, 3), the shape of the full trajectory.
+        dtype : str, optional
+            dtype of the positions. The default is 'float32'.
+
+        Returns
+        -------
+        shared : SharedTrajectory
+            Owning handle of a new segment holding the positions.
+        '''
+        shape = tuple(shape)
+        nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        try:
+            shared = cls(shm.name, shape, dtype, owner=True, shm=shm)
+            if isinstance(blocks, np.ndarray):
+                array = blocks
+                blocks = (array[i:i + 256] for i in range(0, len(array), 256))
+            i = 0
+            for block in blocks:
+                shared.array[i:i + len(block)] = block
+                i += len(block)
+            assert i == shape[0], "expected {} frames, got {}".format(shape[0], i)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        return shared
+
+    def __reduce__(self):
+        #only the name travels to other processes, which attach to the same memory
+        return (SharedTrajectory, (self.name, self.shape, self.dtype.str))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def close(self):
+        '''Release this process's mapping; self.array must not be used afterwards.'''
+        self.array = None
+        self.shm.close()
+
+    def unlink(self):
+        '''Close and, in the owning process, free the segment for all processes.'''
+        self.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
@@ -0,0 +1,110 @@
+"""
+Shared fixtures: a small synthetic SIESTA run directory.
+"""
+
+import numpy as np
+import pytest
+
+FDF = """SystemName water
+SystemLabel w
+NumberOfAtoms 3
+NumberOfSpecies 2
+LatticeConstant 1.0 Ang
+%block LatticeVectors
+ 10.0 0.0 0.0
+ 0.0 10.0 0.0
+ 0.0 0.0 10.0
+%endblock LatticeVectors
+%block ChemicalSpeciesLabel
+ 1 8 O
+ 2 1 H
+%endblock ChemicalSpeciesLabel
+MD.TypeOfRun Verlet
+MD.InitialTimeStep 1
+MD.FinalTimeStep {nframes}
+MD.LengthTimeStep 0.5 fs
+"""
+
+SYMBOLS = ['O', 'H', 'H']
+
+
+def write_ani(path, positions, symbols=SYMBOLS):
+    with open(path, 'w') as f:
+        for frame in positions:
+            f.write('{}\n\n'.format(len(symbols)))
+            for s, xyz in zip(symbols, frame):
+                f.write('{:<3}{:16.8f}{:16.8f}{:16.8f}\n'.format(s, *xyz))
+
+
+def write_mde(path, nsteps, first=1):
+    with open(path, 'w') as f:
+        f.write('# Step     T (K)     E_KS (eV)     E_tot (eV)    Vol (A^3)    P (kBar)\n')
+        for i in range(first, first + nsteps):
+            f.write('{:7d}{:10.3f}{:16.6f}{:16.6f}{:12.3f}{:12.3f}\n'.format(i, 300. + i, -400. - i, -399. - i,
+                                                                              1000., 0.5 * i))
+
+
+@pytest.fixture
+def positions():
+    return np.random.default_rng(0).uniform(-2., 8., size=(20, len(SYMBOLS), 3)).round(6)
+
+
+@pytest.fixture
+def simdir(tmp_path, positions):
+    (tmp_path / 'w.fdf').write_text(FDF.format(nframes=len(positions)))
+    write_ani(tmp_path / 'w.ANI', positions)
+    write_mde(tmp_path / 'w.MDE', len(positions))
+    return tmp_path
+
+
+@pytest.fixture
+def nofdfdir(simdir):
+    (simdir / 'w.fdf').unlink()
+    return simdir
+
+
+def write_md(path, steps, positions, velocities, cells=None, byteorder='<'):
+    '''Unformatted SIESTA .MD history, positions and cells in Ang and velocities in Ang/fs.'''
+    from ccmp_tools.mdhistory import BOHR, _dtype
+    records = np.zeros(len(steps), _dtype(positions.shape[1], cells is not None, byteorder))
+    records['head'] = records['tail'] = positions.shape[1] * 48 + 4
+    records['istep'] = steps
+    records['xa'] = positions / BOHR
+    records['va'] = velocities / BOHR
+    if cells is not None:
+        records['cellhead'] = records['celltail'] = 144
+        records['cell'] = cells / BOHR
+    records.tofile(path)
+
+
+def write_out(path, forces, charges, first=1):
+    '''SIESTA output log of len(forces) MD steps, with coordinates and SCF tables around the parsed sections.'''
+    natoms = forces.shape[1]
+    with open(path, 'w') as f:
+        f.write('Siesta Version  : 4.1.5\n\ninitatomlists: Number of atoms, orbitals, and projectors: '
+                '{:5d}{:6d}{:6d}\n'.format(natoms, 8 * natoms, 9 * natoms))
+        for i, (frame, q) in enumerate(zip(forces, charges)):
+            f.write('\n                     ====================================\n'
+                    '                        Begin MD step = {:6d}\n'
+                    '                        ====================================\n\n'.format(first + i))
+            f.write('outcoor: Atomic coordinates (Ang):\n')
+            for a in range(natoms):
+                f.write('    0.00000000    0.00000000    0.00000000   1       {}  O\n'.format(a + 1))
+            f.write('\n   scf: iscf   Eharris(eV)      E_KS(eV)   FreeEng(eV)   dDmax  Ef(eV) dHmax(eV)\n')
+            for n in range(1, 3 + i % 4):
+                f.write('   scf: {:4d}    -465.8{:02d}    -465.8356    -465.8356  0.0001 -1.3 0.0002\n'.format(n, n))
+            f.write('\nmulliken: Atomic and Orbital Populations:\n\nSpecies: O\nAtom  Qatom  Qorb\n'
+                    '               2s      2py     2pz     2px     2Pdxy   2Pdyz   2Pdz2   2Pdxz\n')
+            for a in range(natoms):
+                f.write('{:4d} {:7.3f}   1.830   1.499   1.499   1.499   0.004   0.001   0.001   0.001\n'
+                        '                0.002   0.003\n'.format(a + 1, q[a]))
+            f.write('\nmulliken: Qtot =        {:.3f}\n\n'.format(q.sum()))
+            f.write('siesta: E_KS(eV) =             -465.8356\n\nsiesta: Atomic forces (eV/Ang):\n')
+            for a in range(natoms):
+                f.write('{:6d}{:12.6f}{:12.6f}{:12.6f}\n'.format(a + 1, *frame[a]))
+            f.write('----------------------------------------\n   Tot   0.000000   0.000000  -0.000000\n'
+                    '----------------------------------------\n   Max    0.254823\n\n')
+            f.write('Stress-tensor-Voigt (kbar):{:12.2f}{:12.2f}{:12.2f}{:12.2f}{:12.2f}{:12.2f}\n'.format(
+                *np.arange(6) + i))
+            f.write('\nElectric dipole (a.u.)  =    0.000000    0.000000    {:.6f}\n'
+                    'Electric dipole (Debye) =    0.000000    0.000000    {:.6f}\n'.format(0.1 * i, 0.25 * i))
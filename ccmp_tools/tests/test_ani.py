@@ -0,0 +1,84 @@
+"""
+Tests for the .ANI utilities in ccmp_tools.ani
+"""
+
+import os
+import numpy as np
+
+from ccmp_tools import ani
+from ccmp_tools.tests.conftest import write_ani
+
+
+def test_cache_roundtrip_and_staleness(simdir, positions):
+    anip = str(simdir / 'w.ANI')
+    assert ani.readcache(anip) is None
+    path = ani.writecache(anip, [positions[:8], positions[8:]], positions.shape)
+    np.testing.assert_allclose(ani.readcache(anip), positions, atol=1e-6)
+    #rewriting the trajectory invalidates and replaces the cache
+    write_ani(anip, positions[:5])
+    os.utime(anip, ns=(0, 0))
+    assert ani.readcache(anip) is None
+    ani.writecache(anip, [positions[:5]], positions[:5].shape)
+    assert not os.path.exists(path)
+    assert ani.readcache(anip).shape == (5, 3, 3)
+
+
+def test_frameindex(simdir, positions):
+    anip = str(simdir / 'w.ANI')
+    offsets = ani.scanoffsets(anip, blocksize=64)
+    assert len(offsets) == len(positions) + 1
+    assert offsets[-1] == os.path.getsize(anip)
+    np.testing.assert_array_equal(ani.frameindex(anip), offsets)
+    assert os.path.exists(ani.indexpath(anip))
+    symbols, xyz = ani.readframe(anip, offsets, -3)
+    assert symbols.tolist() == ['O', 'H', 'H']
+    np.testing.assert_allclose(xyz, positions[-3], atol=1e-5)
+
+
+def test_frameindex_partial_frame(simdir, positions):
+    anip = str(simdir / 'w.ANI')
+    with open(anip, 'a') as f:
+        f.write('3\n\nO 1.0 2.0')
+    offsets = ani.scanoffsets(anip)
+    assert len(offsets) == len(positions) + 1
+
+
+def test_parseblock(simdir, positions):
+    anip = str(simdir / 'w.ANI')
+    with open(anip, 'rb') as f:
+        buf = f.read()
+    np.testing.assert_allclose(ani.parseblock(buf, 3), positions, atol=1e-5)
+
+
+def test_readani(simdir, positions):
+    anip = str(simdir / 'w.ANI')
+    symbols, xyz = ani.readani(anip, blocksize=200)
+    assert symbols.tolist() == ['O', 'H', 'H']
+    np.testing.assert_allclose(xyz, positions, atol=1e-5)
+
+
+def test_estimate(simdir, positions):
+    anip = str(simdir / 'w.ANI')
+    expected = {'frames': len(positions), 'atoms': 3, 'bytes': positions.size * 4}
+    header = ani.estimate(anip)
+    assert {k: header[k] for k in expected} == expected and not header['exact']
+    assert ani.estimate(anip, ani.scanoffsets(anip))['exact']
+
+
+def test_unterminated_last_frame(simdir, positions):
+    from ccmp_tools.md import SiestaSimulation
+    anip = str(simdir / 'w.ANI')
+    with open(anip, 'rb') as f:
+        data = f.read()
+    with open(anip, 'wb') as f:
+        f.write(data.rstrip(b'\n'))
+    assert len(ani.scanoffsets(anip)) - 1 == len(positions)
+    #a file that is still written keeps the frame for when its last line is complete
+    assert len(ani.scanoffsets(anip, partial=True)) - 1 == len(positions) - 1
+    np.testing.assert_allclose(ani.readani(anip)[1], positions, atol=1e-5)
+    np.testing.assert_allclose(ani.readframe(anip, ani.scanoffsets(anip), -1)[1], positions[-1], atol=1e-5)
+    sim = SiestaSimulation(str(simdir))
+    sim.iMD(True, index=True)
+    assert sim.universe.trajectory.n_frames == len(positions)
+    sim.universe.trajectory[-1]
+    np.testing.assert_allclose(sim.universe.atoms.positions, positions[-1], atol=1e-5)
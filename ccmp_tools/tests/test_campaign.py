@@ -0,0 +1,48 @@
+"""
+Tests for loading sets of runs with ccmp_tools.campaign
+"""
+
+import shutil
+import numpy as np
+import pytest
+
+pytest.importorskip('sisl')
+
+from ccmp_tools.campaign import SimulationSet, discover
+
+
+@pytest.fixture
+def sweep(tmp_path_factory, simdir):
+    root = tmp_path_factory.mktemp('campaign') / 'sweep'
+    for name in ('T300', 'T350', 'broken'):
+        shutil.copytree(str(simdir), str(root / name / 'run'))
+    (root / 'broken' / 'run' / 'w.MDE').unlink()
+    (root / 'notes').mkdir()
+    return root
+
+
+def test_discover(sweep):
+    assert [p.split('sweep')[1] for p in discover(str(sweep))] == ['/T300/run', '/T350/run', '/broken/run']
+    assert len(discover(str(sweep / 'T*' / 'run'))) == 2
+
+
+@pytest.mark.parametrize('nprocs', [1, 2])
+def test_load(sweep, nprocs):
+    runs = SimulationSet(str(sweep))
+    table = runs.load(mde=True, nprocs=nprocs)
+    assert len(table) == 2
+    assert list(runs.failures) == [str(sweep / 'broken' / 'run')]
+    assert runs.failures[str(sweep / 'broken' / 'run')].startswith('AssertionError')
+    np.testing.assert_array_equal(table['natoms'], [3, 3])
+    np.testing.assert_array_equal(table['mde_rows'], [20, 20])
+    assert set(table['mdtype']) == {'Verlet'}
+
+
+def test_load_bad_value(sweep):
+    fdfp = sweep / 'T350' / 'run' / 'w.fdf'
+    fdfp.write_text(fdfp.read_text().replace('NumberOfAtoms 3', 'NumberOfAtoms three'))
+    runs = SimulationSet(str(sweep))
+    table = runs.load(nprocs=1)
+    assert len(table) == 3 and np.isnan(table['natoms'][1]) and table['natoms'][0] == 3
+    assert runs.failures[str(sweep / 'T350' / 'run')].startswith('ValueError: natoms')
+    assert table['nspecies'][1] == 2
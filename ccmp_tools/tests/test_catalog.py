@@ -0,0 +1,90 @@
+"""
+Tests for the SQLite metadata catalog in ccmp_tools.catalog
+"""
+
+import os
+import shutil
+import pytest
+
+pytest.importorskip('sisl')
+
+from ccmp_tools.catalog import Catalog
+
+
+@pytest.fixture
+def sweep(tmp_path_factory, simdir):
+    root = tmp_path_factory.mktemp('catalog') / 'sweep'
+    for name, temperature in (('T300', 300), ('T350', 350)):
+        shutil.copytree(str(simdir), str(root / name))
+        with open(str(root / name / 'w.fdf'), 'a') as f:
+            f.write('MD.TargetTemperature {} K\n'.format(temperature))
+    return root
+
+
+def test_update_and_find(sweep, tmp_path):
+    with Catalog(str(tmp_path / 'runs.db')) as cat:
+        assert cat.update(str(sweep), nprocs=1) == {'parsed': 2, 'failed': 0, 'unchanged': 0, 'removed': 0}
+        assert len(cat) == 2
+        (run,) = cat.find(temperature=350., mdtype='verlet')
+        assert run['path'] == str(sweep / 'T350')
+        assert run['natoms'] == 3 and run['nsteps'] == 20 and run['simtype'] == 'md'
+        assert run['chemspeclab'] == [['1', '8', 'O'], ['2', '1', 'H']]
+        assert run['latticevectors'][0] == [10., 0., 0.]
+        assert len(cat.find(temperature=(250, 400))) == 2
+        assert len(cat.find(mdtype='Verlet')) == 2 and not cat.find(path=str(sweep / 'T300').upper())
+        plan = cat.query('EXPLAIN QUERY PLAN SELECT * FROM runs WHERE mdtype = ? COLLATE NOCASE', ('verlet',))
+        assert 'runs_mdtype_nocase' in ' '.join(row['detail'] for row in plan)
+        with pytest.raises(AssertionError):
+            cat.find(nonsense=1)
+
+
+def test_incremental(sweep, tmp_path):
+    dbpath = str(tmp_path / 'runs.db')
+    with Catalog(dbpath) as cat:
+        cat.update(str(sweep), nprocs=1)
+    #reopened catalog only re-parses what changed
+    with Catalog(dbpath) as cat:
+        assert cat.update(str(sweep), nprocs=1)['unchanged'] == 2
+        fdfp = str(sweep / 'T300' / 'w.fdf')
+        with open(fdfp, 'a') as f:
+            f.write('# touched\n')
+        shutil.rmtree(str(sweep / 'T350'))
+        assert cat.update(str(sweep), nprocs=1, prune=True) == {'parsed': 1, 'failed': 0, 'unchanged': 0,
+                                                              'removed': 1}
+        assert cat.paths() == [str(sweep / 'T300')]
+        assert cat.query('SELECT size FROM runs')[0]['size'] == os.path.getsize(fdfp)
+        #a change of an included file is noticed too
+        with open(fdfp, 'a') as f:
+            f.write('%include extra.fdf\n')
+        with open(str(sweep / 'T300' / 'extra.fdf'), 'w') as f:
+            f.write('MD.TargetTemperature 300 K\n')
+        assert cat.update(str(sweep), nprocs=1)['parsed'] == 1
+        assert cat.update(str(sweep), nprocs=1)['unchanged'] == 1
+        with open(str(sweep / 'T300' / 'extra.fdf'), 'w') as f:
+            f.write('MD.TargetTemperature 400 K\n')
+        assert cat.update(str(sweep), nprocs=1)['parsed'] == 1
+        assert cat.find(temperature=400.)
+
+
+def test_prune_glob(sweep, tmp_path):
+    shutil.copytree(str(sweep / 'T300'), str(sweep / 'T300' / 'extra'))
+    os.makedirs(str(sweep / 'T350' / 'run'))
+    shutil.copy(str(sweep / 'T350' / 'w.fdf'), str(sweep / 'T350' / 'run'))
+    with Catalog(str(tmp_path / 'runs.db')) as cat:
+        cat.update(str(sweep), nprocs=1)
+        assert len(cat) == 4
+        #runs under the pattern's prefix that it does not match stay, as do runs that still hold an FDF
+        assert cat.update(str(sweep / 'T*' / 'run'), nprocs=1, prune=True)['removed'] == 0
+        os.remove(str(sweep / 'T350' / 'run' / 'w.fdf'))
+        assert cat.update(str(sweep / 'T*' / 'run'), nprocs=1, prune=True)['removed'] == 1
+        assert str(sweep / 'T300' / 'extra') in cat.paths()
+
+
+def test_prune_list(sweep, tmp_path):
+    runs = [str(sweep / 'T300'), str(sweep / 'T350')]
+    with Catalog(str(tmp_path / 'runs.db')) as cat:
+        cat.update(runs, nprocs=1)
+        shutil.rmtree(runs[1])
+        assert cat.update(runs, nprocs=1, prune=True) == {'parsed': 0, 'failed': 0, 'unchanged': 1,
+                                                          'removed': 1}
+        assert cat.paths() == runs[:1]
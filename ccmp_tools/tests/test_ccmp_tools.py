@@ -10,3 +10,16 @@ import sys
 def test_ccmp_tools_imported():
     """Sample test, will always pass so long as import statement worked"""
     assert "ccmp_tools" in sys.modules
+
+
+def test_import_is_lightweight(tmp_path):
+    """Importing the package and reading an MDE file must not pull in sisl or MDAnalysis"""
+    import subprocess
+    from ccmp_tools.tests.conftest import write_mde
+    write_mde(str(tmp_path / 'w.MDE'), 5)
+    script = ("import sys, ccmp_tools\n"
+              "sim = ccmp_tools.SiestaSimulation(sys.argv[1], fdfb=False)\n"
+              "sim.iMDE(True)\n"
+              "print(','.join(m for m in ('sisl', 'MDAnalysis', 'multiprocessing') if m in sys.modules))\n")
+    out = subprocess.run([sys.executable, '-c', script, str(tmp_path)], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ''
@@ -0,0 +1,78 @@
+"""
+Tests for the FDF utilities in ccmp_tools.fdf
+"""
+
+import os
+import pytest
+
+from ccmp_tools import fdf
+
+
+def test_includes(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'main.fdf').write_text('%include sub/a.fdf\n%block LatticeVectors < cell.fdf\nMissing < nope.fdf\n')
+    (tmp_path / 'sub' / 'a.fdf').write_text('%INCLUDE b.fdf\n')
+    (tmp_path / 'sub' / 'b.fdf').write_text('NumberOfAtoms 3\n')
+    (tmp_path / 'cell.fdf').write_text('1 0 0\n0 1 0\n0 0 1\n')
+    assert sorted(os.path.relpath(p, str(tmp_path)) for p in fdf.includes(str(tmp_path / 'main.fdf'))) == \
+        ['cell.fdf', os.path.join('sub', 'a.fdf'), os.path.join('sub', 'b.fdf')]
+
+
+def test_cache(tmp_path):
+    (tmp_path / 'main.fdf').write_text('%include extra.fdf\n')
+    (tmp_path / 'extra.fdf').write_text('NumberOfAtoms 3\n')
+    cache = fdf.FDFCache(maxsize=2, path=str(tmp_path / 'cache.pkl'))
+    fdfp = str(tmp_path / 'main.fdf')
+    reads = []
+    def read():
+        reads.append(1)
+        return [3]
+    assert cache.get(fdfp, 'NumberOfAtoms', None, read) == [3]
+    cache.get(fdfp, 'NumberOfAtoms', None, read)[0] = 4
+    assert cache.get(fdfp, 'NumberOfAtoms', None, read) == [3]
+    assert len(reads) == 1 and cache.hits == 2
+    #a changed include invalidates the entry
+    (tmp_path / 'extra.fdf').write_text('NumberOfAtoms 30\n')
+    cache.get(fdfp, 'NumberOfAtoms', None, read)
+    assert len(reads) == 2
+    cache.save()
+    assert fdf.FDFCache(path=str(tmp_path / 'cache.pkl')).get(fdfp, 'NumberOfAtoms', None, read) == [3]
+    assert len(reads) == 2
+    #least recently used files are evicted
+    for name in ('a.fdf', 'b.fdf'):
+        (tmp_path / name).write_text('\n')
+        cache.get(str(tmp_path / name), 'x', None, read)
+    assert len(cache) == 2 and os.path.abspath(fdfp) not in cache.entries
+
+
+def test_reader(tmp_path):
+    (tmp_path / 'main.fdf').write_text('SystemLabel w  # label\n%include inc.fdf\nLatticeConstant 5.0 Bohr\n'
+                                       'MD.TargetTemperature 300 K\nMD.Length-Time_Step 0.05 ps\n'
+                                       'spin.polarized .true.\nPiped < other.fdf\n%block Cell < cell.fdf\n'
+                                       'NumberOfAtoms 4\nMesh.Cutoff 1e3\nSCF.DM.Tolerance 5E-4\n')
+    (tmp_path / 'inc.fdf').write_text('NumberOfAtoms 3\n%block ChemicalSpeciesLabel\n 1 8 O ! oxygen\n\n'
+                                      ' 2 1 H\n%endblock ChemicalSpeciesLabel\n')
+    (tmp_path / 'other.fdf').write_text('Piped 7.5\n')
+    (tmp_path / 'cell.fdf').write_text('1 0 0\n# skipped\n0 1 0\n')
+    reader = fdf.FDFReader(str(tmp_path / 'main.fdf'))
+    assert reader.get('systemlabel') == 'w'
+    assert reader.get('NumberOfAtoms') == 3 and reader.get('NumberOfAtoms', 0.) == 3.
+    assert reader.get('MD.LengthTimeStep') == pytest.approx(50.)
+    assert reader.get('LatticeConstant') == pytest.approx(5.0 * 0.529177210903)
+    assert reader.get('MD.TargetTemperature', unit='K') == 300.
+    assert reader.get('MD.TargetTemperature') == pytest.approx(0.025852, rel=1e-4)
+    assert reader.get('SpinPolarized') is True and reader.get('Missing', 'x') == 'x'
+    assert reader.get('ChemicalSpeciesLabel') == ['1 8 O', '2 1 H']
+    assert reader.get('Cell') == ['1 0 0', '0 1 0'] and reader.get('Piped') == 7.5
+    assert reader.get('MeshCutoff') == 1000. and reader.get('SCF.DM.Tolerance') == 5e-4
+    with pytest.raises(ValueError):
+        reader.get('LatticeConstant', unit='fs')
+
+
+def test_reader_matches_sisl(simdir):
+    sisl = pytest.importorskip('sisl')
+    fdfp = str(simdir / 'w.fdf')
+    sile, reader = sisl.get_sile(fdfp), fdf.FDFReader(fdfp)
+    for key in ('SystemLabel', 'LatticeConstant', 'MD.LengthTimeStep', 'MD.FinalTimeStep', 'MD.TypeOfRun',
+                'NumberOfAtoms', 'LatticeVectors', 'ChemicalSpeciesLabel', 'SimulationLabel'):
+        assert reader.get(key) == sile.get(key)
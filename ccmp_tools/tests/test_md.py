@@ -0,0 +1,320 @@
+"""
+Tests for the SIESTA simulation readers in ccmp_tools.md
+"""
+
+import logging, os
+import numpy as np
+import pytest
+
+pytest.importorskip('sisl')
+pytest.importorskip('MDAnalysis')
+
+from ccmp_tools import ani as anitools
+from ccmp_tools.md import SiestaSimulation, findfile
+from ccmp_tools.tests.conftest import write_ani, write_md, write_mde, write_out
+
+
+def test_fdf_metadata(simdir):
+    sim = SiestaSimulation(str(simdir))
+    assert sim.natoms == 3
+    assert sim.nsteps == 20
+    assert sim.simtype == 'md'
+    assert sim.latticevectors.shape == (3, 3)
+
+
+def test_defaultcell(nofdfdir, positions):
+    sim = SiestaSimulation(str(nofdfdir))
+    sim.iMD(True, cellchunk=7)
+    np.testing.assert_allclose(sim.extents, [positions.min(axis=(0, 1)), positions.max(axis=(0, 1))], atol=1e-5)
+    cell = 1.1 * (positions.max() - positions.min())
+    np.testing.assert_allclose(sim.universe.dimensions[:3], 3 * [cell], rtol=1e-5)
+    assert sim.celltime >= 0
+
+
+def test_defaultcell_samples(nofdfdir, positions):
+    sim = SiestaSimulation(str(nofdfdir))
+    sim.iMD(True, cellsamples=5)
+    sampled = positions[::4]
+    np.testing.assert_allclose(sim.extents, [sampled.min(axis=(0, 1)), sampled.max(axis=(0, 1))], atol=1e-5)
+
+
+def test_mde(simdir):
+    sim = SiestaSimulation(str(simdir))
+    sim.iMDE(True)
+    assert sim.mde.shape == (20, 6)
+
+
+def test_ani_cache(nofdfdir, positions, tmp_path_factory):
+    cachedir = str(tmp_path_factory.mktemp('cache'))
+    sim = SiestaSimulation(str(nofdfdir))
+    sim.iMD(True, cache=cachedir)
+    cached = SiestaSimulation(str(nofdfdir))
+    cached.iMD(True, cache=cachedir)
+    assert len(os.listdir(cachedir)) == 1
+    assert cached.universe.trajectory.n_frames == len(positions)
+    cached.universe.trajectory[7]
+    np.testing.assert_allclose(cached.universe.atoms.positions, positions[7], atol=1e-5)
+    np.testing.assert_allclose(cached.extents, sim.extents)
+
+
+def test_ani_index(simdir, positions, monkeypatch):
+    from MDAnalysis.coordinates.XYZ import XYZReader
+    def scan(self):
+        raise AssertionError('full scan of the .ANI file')
+    #with the index, neither loading nor n_frames may count the frames line by line
+    monkeypatch.setattr(XYZReader, '_read_xyz_n_frames', scan)
+    sim = SiestaSimulation(str(simdir))
+    sim.iMD(True, index=True)
+    assert sim.frames == range(len(positions))
+    assert sim.nframes == len(positions)
+    assert sim.universe.trajectory.n_frames == len(positions)
+    sim.universe.trajectory[11]
+    np.testing.assert_allclose(sim.universe.atoms.positions, positions[11], atol=1e-5)
+    np.testing.assert_allclose(sim.frame(11), positions[11], atol=1e-5)
+    monkeypatch.undo()
+    #without it, the frames are only counted when asked for
+    sim = SiestaSimulation(str(simdir))
+    sim.iMD(True)
+    assert '_frames' in sim.__dict__ and sim.__dict__['_frames'] is None
+    assert sim.frames == range(len(positions))
+
+
+@pytest.mark.parametrize('cache', [False, True])
+def test_ani_parallel(nofdfdir, positions, cache):
+    serial = SiestaSimulation(str(nofdfdir))
+    serial.iMD(True)
+    sim = SiestaSimulation(str(nofdfdir))
+    sim.iMD(True, nprocs=2, cache=cache)
+    assert sim.universe.trajectory.n_frames == len(positions)
+    np.testing.assert_allclose(sim.universe.trajectory.coordinate_array, positions, atol=1e-5)
+    np.testing.assert_allclose(sim.extents, serial.extents)
+    assert sim.nspecies == 2
+
+
+def test_ani_native(simdir, positions):
+    sim = SiestaSimulation(str(simdir))
+    sim.iMD(True, native=True)
+    assert sim.universe.atoms.names.tolist() == ['O', 'H', 'H']
+    np.testing.assert_allclose(sim.universe.trajectory.coordinate_array, positions, atol=1e-5)
+
+
+@pytest.mark.parametrize('kwargs', [dict(), dict(nprocs=2), dict(cache=True)])
+def test_ani_select(simdir, positions, kwargs):
+    if kwargs.get('cache'):
+        SiestaSimulation(str(simdir)).iMD(True, cache=True)
+    sim = SiestaSimulation(str(simdir))
+    sim.iMD(True, start=3, stop=-2, step=4, **kwargs)
+    assert sim.frames == range(3, 18, 4)
+    np.testing.assert_allclose(sim.universe.trajectory.coordinate_array, positions[3:-2:4], atol=1e-5)
+    assert sim.universe.trajectory.dt == pytest.approx(2.)
+
+
+def test_ani_select_time(simdir, positions):
+    sim = SiestaSimulation(str(simdir))
+    #dt = 0.5 fs: the last 2.5 fs are the last 5 frames, every 1 fs is every second frame
+    sim.iMD(True, tstart=-0.0025, tstep=0.001, tunit='ps')
+    assert sim.frames == range(15, 20, 2)
+    np.testing.assert_allclose(sim.universe.trajectory.coordinate_array, positions[-5::2], atol=1e-5)
+
+
+def test_mde_stream_and_tail(simdir):
+    sim = SiestaSimulation(str(simdir))
+    sim.iMDE(True)
+    np.testing.assert_array_equal(np.concatenate(list(sim.streamMDE(rows=6))), sim.mde)
+    np.testing.assert_array_equal(sim.tailMDE(3), sim.mde[-3:])
+
+
+def test_mde_fields(simdir):
+    sim = SiestaSimulation(str(simdir))
+    sim.iMDE(True)
+    np.testing.assert_array_equal(sim.mdefields['T'], sim.mde[:, 1])
+    np.testing.assert_array_equal(sim.mde, np.loadtxt(sim.mdep))
+
+
+def test_fdf_is_lazy(simdir):
+    sim = SiestaSimulation(str(simdir))
+    assert 'fdf' not in vars(sim) and 'fdfp' not in vars(sim)
+    assert sim.mdtype == 'Verlet'
+    assert vars(sim)['fdfp'].endswith('w.fdf')
+    assert 'natoms' not in vars(sim)
+    assert sim.chemspeclab == [['1', '8', 'O'], ['2', '1', 'H']]
+
+
+def test_no_fdf(nofdfdir):
+    sim = SiestaSimulation(str(nofdfdir))
+    assert sim.fdf is None and sim.natoms is None and sim.simtype is None
+
+
+def test_filefind_index(simdir, caplog):
+    sim = SiestaSimulation(str(simdir))
+    sim._filefind(True, '.MDE', 'mdep')
+    assert sim.mdep == os.path.join(str(simdir), 'w.MDE')
+    (simdir / 'a.MDE').write_text('')
+    sim.refresh()
+    sim._filefind(True, '.mde', 'mdep')
+    assert sim.mdep == os.path.join(str(simdir), 'a.MDE')
+    assert 'ambiguous' in caplog.text
+    sim._filefind('w.MDE', '.MDE', 'mdep')
+    assert sim.mdep == os.path.join(str(simdir), 'w.MDE')
+
+
+def test_findfile(tmp_path):
+    #the exact extension wins over names containing it, sidecars are never picked
+    (tmp_path / 'w.MDE.bak').write_text('')
+    (tmp_path / 'w.MDE.12-34.npy').write_text('')
+    assert findfile(str(tmp_path), '.MDE') == str(tmp_path / 'w.MDE.bak')
+    (tmp_path / 'w.MDE').write_text('')
+    assert findfile(str(tmp_path), '.mde') == str(tmp_path / 'w.MDE')
+    sim = SiestaSimulation(str(tmp_path))
+    sim._filefind(True, '.MDE', 'mdep')
+    assert sim.mdep == findfile(str(tmp_path), '.MDE')
+    assert findfile(str(tmp_path / 'gone'), '.MDE') is None
+
+
+def test_fdf_cache(simdir):
+    from ccmp_tools import fdf
+    first = SiestaSimulation(str(simdir))
+    assert first.natoms == 3 and first.latticevectors is not None
+    #a second object for the same run is served from the shared cache without opening the FDF with sisl
+    sim = SiestaSimulation(str(simdir))
+    assert sim.natoms == 3 and sim.latticevectors.shape == (3, 3)
+    assert 'fdf' not in vars(sim)
+    assert os.path.join(str(simdir), 'w.fdf') in fdf.CACHE.entries
+
+
+def test_fdf_readers(simdir):
+    from ccmp_tools import fdf
+    fdf.CACHE.clear()
+    builtin = SiestaSimulation(str(simdir))
+    assert builtin.latticevectors is not None and 'fdf' not in vars(builtin)
+    #values the built-in reader cached are not served to a sisl-backed simulation
+    sim = SiestaSimulation(str(simdir), fdfreader='sisl')
+    for attr in ('simlabel', 'latticeconstant', 'dt', 'nsteps', 'mdtype', 'natoms', 'chemspeclab'):
+        assert getattr(sim, attr) == getattr(builtin, attr)
+    assert 'fdf' in vars(sim)
+
+
+def test_follow(tmp_path, positions):
+    (tmp_path / 'w.ANI').write_bytes(b'')
+    write_ani(tmp_path / 'full.ANI', positions)
+    write_mde(tmp_path / 'full.MDE', len(positions))
+    ani, mde = (tmp_path / 'full.ANI').read_bytes(), (tmp_path / 'full.MDE').read_bytes()
+    sim = SiestaSimulation(str(tmp_path))
+    #the run is still writing: 7 whole frames plus part of the 8th, 5 rows plus part of the 6th
+    frame = len(ani) // len(positions)
+    (tmp_path / 'w.ANI').write_bytes(ani[:7*frame + frame // 2])
+    (tmp_path / 'w.MDE').write_bytes(mde[:mde.index(b'\n', mde.index(b'      6')) - 3])
+    assert sim.followMD('w.ANI') == 7 and sim.followMDE('w.MDE') == 5
+    assert sim.universe.trajectory.n_frames == 7
+    (tmp_path / 'w.ANI').write_bytes(ani)
+    (tmp_path / 'w.MDE').write_bytes(mde)
+    assert sim.followMD() == 13 and sim.followMDE() == 15
+    assert sim.followMD() == 0 and sim.followMDE() == 0
+    assert sim.universe.trajectory.n_frames == len(positions) and sim.frames == range(len(positions))
+    sim.universe.trajectory[-1]
+    np.testing.assert_allclose(sim.universe.atoms.positions, positions[-1], atol=1e-5)
+    np.testing.assert_array_equal(sim.mdefields['step'], np.arange(1, len(positions) + 1))
+    #a restarted run is read again from the start
+    write_mde(tmp_path / 'w.MDE', 3)
+    assert sim.followMDE() == 3 and len(sim.mde) == 3
+
+
+def test_instrument(simdir, caplog):
+    import logging
+    caplog.set_level(logging.DEBUG, logger='ccmp_tools.instrument')
+    sim = SiestaSimulation(str(simdir), instrument=True)
+    sim.iMD(True, native=True, index=True)
+    sim.iMDE(True)
+    stages = [r['stage'] for r in sim.stages.records]
+    assert stages == ['iMD.find', 'iMD.index', 'fdf.find', 'fdf.read', 'iMD.fdf', 'iMD.preflight', 'iMD.universe',
+                      'iMDE.find', 'iMDE.read']
+    read = sim.stages.records[-1]
+    assert read['path'].endswith('w.MDE') and read['seconds'] >= 0
+    if read['bytes_read'] is not None:
+        assert read['bytes_read'] >= os.path.getsize(read['path'])
+    assert 'iMD.universe' in sim.stages.report() and 'iMDE.read' in caplog.text
+    assert sim.stages.totals()['iMDE.read'][0] == 1
+    assert SiestaSimulation(str(simdir)).stages is None
+
+
+@pytest.mark.parametrize('nprocs', [1, 2])
+def test_positions(simdir, positions, tmp_path_factory, nprocs):
+    cachedir = str(tmp_path_factory.mktemp('positions'))
+    sim = SiestaSimulation(str(simdir))
+    mapped = sim.mapMD(cache=cachedir, nprocs=nprocs)
+    assert isinstance(mapped, np.memmap) and mapped.dtype == np.float32 and not mapped.flags.writeable
+    np.testing.assert_allclose(mapped, positions, atol=1e-5)
+    with pytest.raises(ValueError):
+        mapped[0, 0, 0] = 1.
+    #the default location is next to the .ANI file
+    assert SiestaSimulation(str(simdir)).positions.shape == positions.shape
+    assert any(name.endswith('.npy') for name in os.listdir(str(simdir)))
+
+
+@pytest.mark.parametrize('source', ['ani', 'positions', 'xyz', 'native'])
+def test_itermd(simdir, positions, source):
+    sim = SiestaSimulation(str(simdir))
+    if source == 'positions':
+        sim.mapMD()
+    elif source != 'ani':
+        sim.iMD(True, native=source == 'native')
+    batches = [(steps, times, block.copy()) for steps, times, block in sim.iterMD(chunk=3, start=2, step=2)]
+    assert [len(block) for steps, times, block in batches] == [3, 3, 3]
+    steps, times, blocks = [np.concatenate(b) for b in zip(*batches)]
+    np.testing.assert_allclose(blocks, positions[2::2], atol=1e-5)
+    np.testing.assert_array_equal(steps, np.arange(2, 20, 2) + 1)
+    np.testing.assert_allclose(times, np.arange(2, 20, 2) * 0.5)
+
+
+def test_budget(simdir, positions, caplog, monkeypatch):
+    sim = SiestaSimulation(str(simdir))
+    sim.iMD(True, native=True, start=4)
+    assert sim.preflight['selected'] == 16 and sim.preflight['fits']
+    assert not isinstance(sim.universe.trajectory.coordinate_array, np.memmap)
+    #over budget, only the selected frames are converted to a temporary binary file and memory-mapped
+    converted = []
+    iterblocks = anitools.iterblocks
+    monkeypatch.setattr(anitools, 'iterblocks', lambda *args: converted.append(args[3]) or iterblocks(*args))
+    sim = SiestaSimulation(str(simdir))
+    with caplog.at_level(logging.WARNING, logger='ccmp_tools.md'):
+        sim.iMD(True, native=True, start=4, budget=100)
+    assert 'memory budget' in caplog.text and not sim.preflight['fits']
+    assert isinstance(sim.universe.trajectory.coordinate_array, np.memmap)
+    np.testing.assert_allclose(sim.universe.trajectory.coordinate_array, positions[4:], atol=1e-5)
+    assert sim.frames == range(4, 20) and converted == [range(4, 20)]
+    #without cache, nothing is written next to the trajectory
+    assert not [f for f in os.listdir(str(simdir)) if f.endswith('.npy')]
+    sim.iMD(True, native=True, budget=100, cache=True)
+    assert [f for f in os.listdir(str(simdir)) if f.endswith('.npy')]
+
+
+@pytest.mark.parametrize('varcel', [False, True])
+def test_mdhistory(simdir, positions, varcel):
+    velocities = np.random.default_rng(1).normal(0., 0.01, positions.shape)
+    cells = np.stack([np.eye(3) * (10. + i) for i in range(len(positions))]) if varcel else None
+    write_md(str(simdir / 'w.MD'), np.arange(1, len(positions) + 1), positions, velocities, cells)
+    sim = SiestaSimulation(str(simdir))
+    sim.iMDhistory(start=2, step=3)
+    assert sim.mdp.endswith('w.MD') and sim.frames == range(2, 20, 3)
+    np.testing.assert_array_equal(sim.mdsteps, np.arange(3, 21, 3))
+    np.testing.assert_allclose(sim.mdpositions, positions[2::3], atol=1e-12)
+    np.testing.assert_allclose(sim.mdvelocities, velocities[2::3], atol=1e-12)
+    trajectory = sim.universe.trajectory
+    assert trajectory.n_frames == 6 and list(sim.universe.atoms.names) == ['O', 'H', 'H']
+    trajectory[1]
+    np.testing.assert_allclose(trajectory.ts.velocities, velocities[5], atol=1e-6)
+    assert trajectory.ts.dimensions[0] == pytest.approx(15. if varcel else 10.)
+    if varcel:
+        np.testing.assert_allclose(sim.mdcells, cells[2::3])
+    else:
+        assert sim.mdcells is None
+
+
+def test_out(simdir):
+    forces = np.random.default_rng(2).normal(0., 1., (20, 3, 3)).round(6)
+    write_out(str(simdir / 'w.out'), forces, np.full((20, 3), 6.))
+    sim = SiestaSimulation(str(simdir))
+    sim.iOUT(quantities=('forces', 'scf'))
+    assert sim.outp.endswith('w.out') and sorted(sim.out) == ['forces', 'natoms', 'scf', 'step']
+    np.testing.assert_allclose(sim.out['forces'], forces)
+    np.testing.assert_array_equal(sim.out['step'], np.arange(1, 21))
@@ -0,0 +1,62 @@
+"""
+Tests for the .MDE utilities in ccmp_tools.mde
+"""
+
+import numpy as np
+
+from ccmp_tools import mde
+from ccmp_tools.tests.conftest import write_mde
+
+
+def test_iterblocks(tmp_path):
+    mdep = str(tmp_path / 'w.MDE')
+    write_mde(mdep, 1000)
+    full = np.loadtxt(mdep, comments='#')
+    with open(mdep, 'a') as f:
+        f.write('   1001   300.0   -400')
+    blocks = list(mde.iterblocks(mdep, rows=300, blocksize=1000))
+    assert [len(b) for b in blocks] == [300, 300, 300, 100]
+    np.testing.assert_array_equal(np.concatenate(blocks), full)
+
+
+def test_tail(tmp_path):
+    mdep = str(tmp_path / 'w.MDE')
+    write_mde(mdep, 1000)
+    full = np.loadtxt(mdep, comments='#')
+    np.testing.assert_array_equal(mde.tail(mdep, 7, blocksize=64), full[-7:])
+    np.testing.assert_array_equal(mde.tail(mdep, 5000), full)
+
+
+def test_readmde_fixedwidth(tmp_path):
+    mdep = str(tmp_path / 'w.MDE')
+    write_mde(mdep, 3000)
+    #a restart appends another header
+    write_mde(str(tmp_path / 'restart.MDE'), 10, first=3001)
+    with open(mdep, 'a') as f, open(str(tmp_path / 'restart.MDE')) as g:
+        f.write(g.read())
+    rows = mde.readmde(mdep)
+    np.testing.assert_array_equal(rows, np.loadtxt(mdep, comments='#'))
+    assert rows.shape == (3010, 6)
+    assert (rows[:, 2] < 0).all()
+
+
+def test_readmde_fallback(tmp_path):
+    mdep = tmp_path / 'w.MDE'
+    mdep.write_text('# Step T E_KS E_tot Vol P\n1 300.5 -400.25 -399.5 1e3 0.5\n2 301 -401 -400.0 1000 -0.25\n')
+    np.testing.assert_array_equal(mde.readmde(str(mdep)), [[1, 300.5, -400.25, -399.5, 1e3, 0.5],
+                                                           [2, 301, -401, -400., 1000, -0.25]])
+
+
+def test_readmde_header_only(tmp_path):
+    mdep = tmp_path / 'w.MDE'
+    mdep.write_text('# Step     T (K)     E_KS (eV)     E_tot (eV)    Vol (A^3)    P (kBar)\n')
+    assert mde.readmde(str(mdep)).shape == (0, len(mde.COLUMNS)) == mde.follow(str(mdep))[0].shape
+    assert mde.fieldview(mde.readmde(str(mdep))).dtype.names == mde.COLUMNS
+
+
+def test_fieldview():
+    rows = np.arange(12.).reshape(2, 6)
+    fields = mde.fieldview(rows)
+    assert fields.dtype.names == mde.COLUMNS
+    np.testing.assert_array_equal(fields['E_tot'], rows[:, 3])
+    assert np.shares_memory(fields, rows)
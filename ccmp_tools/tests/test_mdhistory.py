@@ -0,0 +1,22 @@
+"""
+Tests for the binary .MD history reader in ccmp_tools.mdhistory
+"""
+
+import numpy as np
+
+from ccmp_tools import mdhistory
+from ccmp_tools.tests.conftest import write_md
+
+
+def test_readmd_byteorder_and_partial_step(tmp_path, positions):
+    velocities = positions / 100.
+    mdp = str(tmp_path / 'w.MD')
+    write_md(mdp, np.arange(len(positions)), positions, velocities, byteorder='>')
+    #a step still being written is left out
+    with open(mdp, 'ab') as f:
+        f.write(b'\0' * 40)
+    steps, xa, va, cells = mdhistory.readmd(mdp)
+    assert mdhistory.layout(mdp).names[:2] == ('head', 'istep') and cells is None
+    np.testing.assert_array_equal(steps, np.arange(len(positions)))
+    np.testing.assert_allclose(xa, positions, atol=1e-12)
+    np.testing.assert_allclose(va, velocities, atol=1e-12)
@@ -0,0 +1,44 @@
+"""
+Tests for the asyncio monitor in ccmp_tools.monitor
+"""
+
+import asyncio
+
+from ccmp_tools.monitor import Monitor
+from ccmp_tools.tests.conftest import write_mde
+
+
+def test_poll(tmp_path):
+    runs = [tmp_path / name for name in ('a', 'b', 'c')]
+    for run in runs:
+        run.mkdir()
+    write_mde(runs[0] / 'w.MDE', 10)
+    write_mde(runs[1] / 'w.MDE', 4)
+    monitor = Monitor([str(r) for r in runs], concurrency=2)
+    updates = {u['path']: u for u in asyncio.run(monitor.poll())}
+    assert sorted(updates) == [str(runs[0]), str(runs[1])]
+    assert updates[str(runs[0])]['step'] == 10 and updates[str(runs[0])]['drift'] == -9.
+    assert updates[str(runs[1])]['P'] == 2.
+    #unchanged files are not reported again, grown and new ones are
+    with open(str(runs[1] / 'w.MDE'), 'a') as f:
+        f.write('      5   305.000     -405.000000     -404.000000    1000.000       2.500\n')
+    write_mde(runs[2] / 'w.MDE', 2)
+    updates = {u['path']: u for u in asyncio.run(monitor.poll())}
+    assert sorted(updates) == [str(runs[1]), str(runs[2])]
+    assert updates[str(runs[1])]['rows'] == 5 and updates[str(runs[1])]['new'] == 1
+
+
+def test_iterate_and_callback(tmp_path):
+    write_mde(tmp_path / 'w.MDE', 3)
+    monitor = Monitor([str(tmp_path)], interval=0.01)
+
+    async def first():
+        async for update in monitor:
+            monitor.stop()
+            return update
+    assert asyncio.run(first())['rows'] == 3
+
+    seen = []
+    monitor = Monitor([str(tmp_path)], interval=0.01)
+    asyncio.run(monitor.run(seen.append, polls=2))
+    assert len(seen) == 1 and seen[0]['step'] == 3
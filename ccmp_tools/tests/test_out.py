@@ -0,0 +1,36 @@
+"""
+Tests for the SIESTA output log parser in ccmp_tools.out
+"""
+
+import numpy as np
+import pytest
+
+from ccmp_tools import out
+from ccmp_tools.tests.conftest import write_out
+
+
+@pytest.mark.parametrize('blocksize', [1 << 24, 100])
+def test_readout(tmp_path, blocksize):
+    rng = np.random.default_rng(0)
+    forces = rng.normal(0., 1., (7, 4, 3)).round(6)
+    charges = rng.uniform(5., 7., (7, 4)).round(3)
+    outp = str(tmp_path / 'w.out')
+    write_out(outp, forces, charges, first=3)
+    #fewer preallocated steps than in the log, and sections split over blocks
+    result = out.readout(outp, nsteps=2, blocksize=blocksize)
+    assert result['natoms'] == 4
+    np.testing.assert_array_equal(result['step'], np.arange(3, 10))
+    np.testing.assert_allclose(result['forces'], forces)
+    np.testing.assert_allclose(result['mulliken'], charges)
+    np.testing.assert_array_equal(result['scf'], 2 + np.arange(7) % 4)
+    np.testing.assert_allclose(result['stress'], np.arange(6) + np.arange(7)[:, None])
+    np.testing.assert_allclose(result['dipole'][:, 2], 0.25 * np.arange(7))
+
+
+def test_readout_selected(tmp_path):
+    forces = np.ones((2, 3, 3))
+    write_out(str(tmp_path / 'w.out'), forces, np.ones((2, 3)))
+    result = out.readout(str(tmp_path / 'w.out'), quantities=('stress',))
+    assert sorted(result) == ['natoms', 'step', 'stress'] and result['stress'].shape == (2, 6)
+    with pytest.raises(AssertionError):
+        out.readout(str(tmp_path / 'w.out'), quantities=('charges',))
@@ -0,0 +1,55 @@
+"""
+Tests for shared memory trajectories in ccmp_tools.shared
+"""
+
+import multiprocessing, pickle, subprocess, sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+
+from ccmp_tools.shared import SharedTrajectory
+
+
+def _framesum(args):
+    shared, frame = args
+    return float(shared.array[frame].sum()), shared.array.flags.writeable
+
+
+@pytest.mark.parametrize('method', ['fork', 'spawn'])
+def test_publish_and_attach(positions, method):
+    with SharedTrajectory.publish(positions.astype(np.float32), positions.shape) as shared:
+        np.testing.assert_array_equal(shared.array, positions.astype(np.float32))
+        assert len(pickle.dumps(shared)) < 200
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context(method)) as pool:
+            results = list(pool.map(_framesum, [(shared, i) for i in range(len(positions))]))
+        np.testing.assert_allclose([r[0] for r in results], positions.astype(np.float32).sum(axis=(1, 2)),
+                                   rtol=1e-6)
+        assert not any(r[1] for r in results)
+        #the segment outlives the workers
+        attached = pickle.loads(pickle.dumps(shared))
+        assert attached.array[-1, -1, -1] == shared.array[-1, -1, -1]
+        attached.close()
+
+
+def test_share_simulation(simdir, positions):
+    pytest.importorskip('MDAnalysis')
+    from ccmp_tools.md import SiestaSimulation
+    sim = SiestaSimulation(str(simdir))
+    with sim.shareMD() as shared:
+        np.testing.assert_allclose(shared.array, positions, atol=1e-5)
+    sim.iMD(True, native=True)
+    with sim.shareMD() as shared:
+        np.testing.assert_array_equal(shared.array, sim.universe.trajectory.coordinate_array)
+
+
+def test_attach_elsewhere(positions):
+    #a process not started by multiprocessing has a resource tracker of its own, which must not unlink the segment
+    with SharedTrajectory.publish(positions.astype(np.float32), positions.shape) as shared:
+        script = 'import pickle, sys; shared = pickle.loads(sys.stdin.buffer.read()); print(shared.array.sum())'
+        result = subprocess.run([sys.executable, '-c', script], input=pickle.dumps(shared), capture_output=True,
+                                check=True)
+        assert float(result.stdout) == pytest.approx(float(shared.array.sum()), rel=1e-5)
+        assert b'leaked' not in result.stderr
+        attached = pickle.loads(pickle.dumps(shared))
+        np.testing.assert_array_equal(attached.array, shared.array)
+        attached.close()